@@ -0,0 +1,58 @@
+import threading
+import time
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a failing dependency for a while.
+
+    After `failure_threshold` consecutive failures the circuit opens, and
+    `allow()` returns False for `reset_timeout` seconds. Then a single trial
+    call is let through, which closes the circuit on success or reopens it.
+    Calls that end without an outcome, e.g. when cancelled, must `release()`.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial_running = False
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+
+            if self._trial_running:
+                return False
+
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+
+            self._trial_running = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """End a call without an outcome, so another trial can be let through."""
+        with self._lock:
+            self._trial_running = False
@@ -1,4 +1,5 @@
 from functools import lru_cache
+from typing import Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -7,15 +8,44 @@ class Settings(BaseSettings):
     APP_URL: str = "http://localhost:3000"
     DATABASE_URL: str
 
+    # Database connection pool configuration (per process, per engine)
+    DATABASE_POOL_SIZE: int = 5
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_TIMEOUT: float = 30
+    DATABASE_POOL_RECYCLE: int = 60 * 30
+    DATABASE_POOL_PRE_PING: bool = True
+    # Milliseconds before a statement of a web request is cancelled, 0 disables
+    # it. Celery tasks and migrations don't have one
+    DATABASE_STATEMENT_TIMEOUT: int = 30_000
+    # Executions of a query before psycopg prepares it server-side, None disables
+    # it (needed behind PgBouncer in transaction pooling mode)
+    DATABASE_PREPARE_THRESHOLD: int | None = 2
+
+    # Optional read replica for read-only endpoints
+    DATABASE_READ_URL: str | None = None
+    DATABASE_READ_MAX_LAG: float = 10  # seconds before falling back to primary
+    DATABASE_READ_LAG_CHECK_INTERVAL: float = 5  # seconds
+
+    # Raise instead of logging when an endpoint exceeds its query budget
+    QUERY_BUDGET_STRICT: bool = False
+
     SIGNUP_ENABLED: bool = True
 
     JWT_SECRET: str
     JWT_ALGORITHM: str = "HS256"
+    JWT_CACHE_SIZE: int = 10_000  # Decoded tokens kept in-process until they expire
 
     ACCESS_TOKEN_EXPIRATION: int = 60 * 15
     REFRESH_TOKEN_EXPIRATION: int = 60 * 60 * 24 * 7
     EMAIL_TOKEN_EXPIRATION: int = 60 * 60 * 24
     WAITLIST_TOKEN_EXPIRATION: int = 60 * 60 * 24
+    # Seconds a rotated refresh token may still be presented (e.g. by concurrent
+    # requests) before it's treated as stolen and every session is revoked
+    REFRESH_TOKEN_REUSE_GRACE: int = 30
+
+    # Password hashing thread pool, requests beyond the pending limit get a 503
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 16
 
     # Redis configuration
     REDIS_HOST: str = "localhost"
@@ -24,6 +54,15 @@ class Settings(BaseSettings):
     REDIS_PASSWORD: str = ""
     REDIS_PREFIX: str = "koru:"
 
+    # Rate limits and concurrency caps of the expensive routes, see
+    # api/middleware/rate_limit.py for the limits themselves
+    RATE_LIMIT_ENABLED: bool = True
+
+    # Authenticated user cache, in-process and in Redis
+    USER_CACHE_SIZE: int = 10_000
+    USER_CACHE_LOCAL_TTL: float = 10  # seconds other processes may serve stale
+    USER_CACHE_TTL: int = 60 * 60
+
     # RabbitMQ configuration
     RABBITMQ_HOST: str = "localhost"
     RABBITMQ_PORT: int = 5672
@@ -34,10 +73,55 @@ class Settings(BaseSettings):
     # hCaptcha configuration
     HCAPTCHA_SITEKEY: str
     HCAPTCHA_SECRET: str
+    # "static" accepts every token, for local load tests
+    HCAPTCHA_BACKEND: Literal["hcaptcha", "static"] = "hcaptcha"
+    HCAPTCHA_VERIFY_URL: str = "https://hcaptcha.com/siteverify"
+    HCAPTCHA_TIMEOUT: float = 3  # seconds
+    HCAPTCHA_CONNECT_TIMEOUT: float = 1  # seconds
+    # Consecutive failures before captcha-protected requests are rejected with a
+    # 503 for the reset timeout, instead of waiting on hCaptcha
+    HCAPTCHA_BREAKER_THRESHOLD: int = 5
+    HCAPTCHA_BREAKER_RESET_TIMEOUT: float = 30  # seconds
+
+    # Metrics configuration, the endpoint returns 404 when no token is set
+    METRICS_TOKEN: str = ""
 
     # GoCardless configuration
     GOCARDLESS_SECRET_ID: str
     GOCARDLESS_SECRET_KEY: str
+    GOCARDLESS_URL: str = "https://bankaccountdata.gocardless.com/api/v2"
+    GOCARDLESS_TIMEOUT: float = 30  # seconds
+    GOCARDLESS_CONNECT_TIMEOUT: float = 5  # seconds
+    GOCARDLESS_POOL_SIZE: int = 20  # Connections kept alive per process
+    GOCARDLESS_MAX_RETRIES: int = 4
+    GOCARDLESS_BACKOFF_BASE: float = 0.5  # seconds, doubled on every retry
+    # Rate limits resetting later than this fail the call instead of waiting
+    GOCARDLESS_MAX_RETRY_WAIT: float = 60  # seconds
+    # Longer rate limits are retried by rescheduling the import task, up to this
+    GOCARDLESS_TASK_MAX_RETRY_WAIT: float = 60 * 15  # seconds
+    # Requests in flight at once per import task, and accounts per import task
+    GOCARDLESS_CONCURRENCY: int = 8
+    GOCARDLESS_IMPORT_BATCH_SIZE: int = 10
+    # Imports refetch this many days before the newest transaction already seen
+    GOCARDLESS_SYNC_OVERLAP_DAYS: int = 7
+    # Transaction downloads larger than this are buffered on disk
+    GOCARDLESS_SPOOL_MAX_SIZE: int = 1024 * 1024  # bytes
+    # Transactions normalized and upserted at once while importing, batches from
+    # COPY_UPSERT_THRESHOLD (api/db/utils.py) on are copied into a staging table
+    GOCARDLESS_UPSERT_BATCH_SIZE: int = 5000
+    # Institutions are refreshed in the background once older than this, and
+    # served from the cache for up to the TTL should refreshing fail
+    GOCARDLESS_INSTITUTIONS_REFRESH_AFTER: int = 60 * 60 * 24  # seconds
+    GOCARDLESS_INSTITUTIONS_CACHE_TTL: int = 60 * 60 * 24 * 7  # seconds
+    # Account details change rarely, imports reuse them for this long
+    GOCARDLESS_DETAILS_CACHE_TTL: int = 60 * 60 * 24  # seconds
+    # Further imports of an account are skipped while one is in progress, at
+    # most this long
+    GOCARDLESS_IMPORT_CLAIM_TTL: int = 60 * 30  # seconds
+    # Token fetches wait this long for another process already fetching one
+    GOCARDLESS_TOKEN_WAIT: float = 10  # seconds
+    # Access tokens are refreshed in the background this long before expiry
+    GOCARDLESS_TOKEN_REFRESH_AHEAD: float = 60 * 10  # seconds
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -59,6 +59,23 @@ class GoCardlessAPIError(GoCardlessException):
         super().__init__(message, error_code)
 
 
+class GoCardlessRateLimitError(GoCardlessAPIError):
+    """Raised when GoCardless rate limits a request for longer than we wait."""
+
+    def __init__(
+        self,
+        operation: str,
+        retry_after: float,
+        response_text: str,
+        message: str | None = None,
+        error_code: str | None = None,
+    ):
+        self.retry_after = retry_after
+        if message is None:
+            message = f"Rate limited to {operation} for {retry_after:.0f}s"
+        super().__init__(operation, response_text, 429, message, error_code)
+
+
 class ConnectionImportException(KoruBaseException):
     """Raised when there are issues with GoCardless connections."""
 
@@ -95,3 +112,54 @@ class ConnectionMissingDataError(ConnectionImportException):
         if message is None:
             message = f"GoCardless connection {connection_id} has no {missing_field}"
         super().__init__(message, error_code)
+
+
+class QueryBudgetExceededError(KoruBaseException):
+    """Raised when an endpoint runs more database queries than it allows."""
+
+    def __init__(
+        self,
+        endpoint: str,
+        max_queries: int,
+        query_count: int,
+        message: str | None = None,
+        error_code: str | None = None,
+    ):
+        self.endpoint = endpoint
+        self.max_queries = max_queries
+        self.query_count = query_count
+        if message is None:
+            message = (
+                f"{endpoint} ran {query_count} queries, the budget is {max_queries}"
+            )
+        super().__init__(message, error_code)
+
+
+class PasswordHasherBusyError(KoruBaseException):
+    """Raised when too many password hashes are already pending."""
+
+    def __init__(
+        self,
+        pending: int,
+        message: str | None = None,
+        error_code: str | None = None,
+    ):
+        self.pending = pending
+        if message is None:
+            message = f"Password hasher is busy with {pending} pending hashes"
+        super().__init__(message, error_code)
+
+
+class CaptchaUnavailableError(KoruBaseException):
+    """Raised when captcha tokens can't be verified right now."""
+
+    def __init__(
+        self,
+        reason: str,
+        message: str | None = None,
+        error_code: str | None = None,
+    ):
+        self.reason = reason
+        if message is None:
+            message = f"Captcha verification is unavailable: {reason}"
+        super().__init__(message, error_code)
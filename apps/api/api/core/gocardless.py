@@ -1,7 +1,30 @@
+import hashlib
+import logging
+import random
+import tempfile
+import threading
+import time
+from collections.abc import Callable, Iterator, Mapping
+from contextlib import contextmanager, suppress
+from datetime import date
+from functools import partial
+from types import TracebackType
+from typing import IO, Any, Generic, NamedTuple, Self, TypeVar
+
 import requests
+from redis.exceptions import LockError
+from redis.lock import Lock
+from requests.adapters import HTTPAdapter
 
+from api.core.cache import TTLCache
 from api.core.config import settings
-from api.core.exceptions import GoCardlessAPIError
+from api.core.exceptions import GoCardlessAPIError, GoCardlessRateLimitError
+from api.core.gocardless_quota import (
+    AccountEndpoint,
+    record_account_call,
+    store_account_details,
+)
+from api.core.json_stream import iter_array
 from api.schemas.gocardless import (
     AccountDetails,
     AccountDetailsResponse,
@@ -11,212 +34,982 @@ from api.schemas.gocardless import (
     InstitutionsResponse,
     RefreshResponse,
     TokenResponse,
+    Transaction,
     TransactionsContainer,
     TransactionsResponse,
 )
 
 from .redis import redis_client
 
-GOCARDLESS_URL = "https://bankaccountdata.gocardless.com/api/v2"
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
 TOKEN_EXPIRY_BUFFER = 60
 
+# How long the token lock is held at most, should its holder die, and how often
+# processes waiting on it check for the token
+TOKEN_LOCK_TIMEOUT = 60
+TOKEN_LOCK_POLL_INTERVAL = 0.1
 
-def get_token() -> str:
-    token = redis_client.get(f"{settings.REDIS_PREFIX}gocardless:token")
+# Failed or contended background refreshes are retried after this long, and
+# a process refreshing something holds it for at most the timeout
+REFRESH_RETRY_INTERVAL = 30
+REFRESH_LOCK_TIMEOUT = 60
 
-    if token:
-        assert isinstance(token, str)
+# Each rate limit scope sends its remaining requests and the seconds until it
+# resets, the account scoped limit only on the per-account endpoints. The API
+# docs spell them with the HTTP_ prefix, so both forms are accepted.
+RATE_LIMIT_SCOPES = ("X-RateLimit", "X-RateLimit-Account-Success")
 
-        return token
+RETRYABLE_STATUS_CODES = {500, 502, 503, 504}
 
-    refresh_token = redis_client.get(f"{settings.REDIS_PREFIX}gocardless:refresh_token")
+DOWNLOAD_CHUNK_SIZE = 1 << 16
 
-    if refresh_token:
-        response = requests.post(
-            f"{GOCARDLESS_URL}/token/refresh/",
-            data={
-                "refresh": refresh_token,
-            },
-        )
 
-        if not response.ok:
-            raise GoCardlessAPIError(
-                "refresh GoCardless token",
-                response.text,
-                status_code=response.status_code,
-            )
-
-        token = RefreshResponse.model_validate_json(response.text)
-        redis_client.set(
-            f"{settings.REDIS_PREFIX}gocardless:token",
-            token.access,
-            token.access_expires - TOKEN_EXPIRY_BUFFER,
-        )
-        return token.access
+def _header_number(headers: Mapping[str, str], name: str) -> float | None:
+    value = headers.get(name)
 
-    response = requests.post(
-        f"{GOCARDLESS_URL}/token/new/",
-        data={
-            "secret_id": settings.GOCARDLESS_SECRET_ID,
-            "secret_key": settings.GOCARDLESS_SECRET_KEY,
-        },
+    if value is None:
+        value = headers.get("HTTP_" + name.upper().replace("-", "_"))
+
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def retry_after_seconds(headers: Mapping[str, str]) -> float | None:
+    """The wait requested by the headers of a rate limited response, if any."""
+    retry_after = _header_number(headers, "Retry-After")
+
+    if retry_after is not None:
+        return retry_after
+
+    resets = []
+
+    for scope in RATE_LIMIT_SCOPES:
+        reset = _header_number(headers, f"{scope}-Reset")
+
+        if reset is None:
+            continue
+
+        # Prefer the scopes that are exhausted, the others don't block
+        if _header_number(headers, f"{scope}-Remaining") == 0:
+            return reset
+
+        resets.append(reset)
+
+    return max(resets) if resets else None
+
+
+def record_account_response(
+    account_endpoint: tuple[str, AccountEndpoint],
+    success: bool,
+    headers: Mapping[str, str],
+) -> None:
+    """Record a call to a per-account endpoint against the account's quota."""
+    remaining = _header_number(headers, "X-RateLimit-Account-Success-Remaining")
+
+    # Only successful calls count, failures only if the account limit was hit
+    if not success and remaining is None:
+        return
+
+    account_id, endpoint = account_endpoint
+    record_account_call(
+        account_id,
+        endpoint,
+        success,
+        remaining,
+        _header_number(headers, "X-RateLimit-Account-Success-Reset"),
     )
 
-    if not response.ok:
-        raise GoCardlessAPIError(
-            "create GoCardless token",
-            response.text,
-            status_code=response.status_code,
+
+def spool_file() -> IO[bytes]:
+    """A temporary file for a response body, kept in memory while small."""
+    return tempfile.SpooledTemporaryFile(max_size=settings.GOCARDLESS_SPOOL_MAX_SIZE)
+
+
+def iter_booked_transactions(body: IO[bytes]) -> Iterator[Transaction]:
+    """Parse the booked transactions of a downloaded body, then close it."""
+    with body:
+        body.seek(0)
+
+        for item in iter_array(
+            iter(partial(body.read, DOWNLOAD_CHUNK_SIZE), b""),
+            ("transactions", "booked"),
+        ):
+            yield Transaction.model_validate(item)
+
+
+class RetryPolicy:
+    """
+    Decides whether and when failed GoCardless requests are retried.
+
+    Rate limited requests are retried after the wait GoCardless asks for, as
+    long as it's no longer than `max_retry_wait`. Failed connections and
+    server errors are retried with exponential backoff, the latter only for
+    idempotent requests.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = settings.GOCARDLESS_MAX_RETRIES,
+        backoff_base: float = settings.GOCARDLESS_BACKOFF_BASE,
+        max_retry_wait: float = settings.GOCARDLESS_MAX_RETRY_WAIT,
+    ) -> None:
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_retry_wait = max_retry_wait
+
+    def backoff(self, attempt: int) -> float:
+        return float(self.backoff_base * 2**attempt * random.uniform(0.5, 1.5))
+
+    def wait_after_error(
+        self, operation: str, error: Exception, retryable: bool, attempt: int
+    ) -> float:
+        """Seconds to wait before retrying after `error`, raises if it can't be."""
+        if not retryable or attempt >= self.max_retries:
+            raise GoCardlessAPIError(operation, repr(error)) from error
+
+        logger.warning("GoCardless %s failed (%r), retrying", operation, error)
+        return self.backoff(attempt)
+
+    def wait_after_response(
+        self,
+        operation: str,
+        status_code: int,
+        headers: Mapping[str, str],
+        text: str,
+        idempotent: bool,
+        attempt: int,
+    ) -> float:
+        """Seconds to wait before retrying a failed response, raises if it can't be."""
+        if status_code == 429:
+            wait = retry_after_seconds(headers) or self.backoff(attempt)
+
+            if wait > self.max_retry_wait or attempt >= self.max_retries:
+                raise GoCardlessRateLimitError(operation, wait, text)
+        elif (
+            idempotent
+            and status_code in RETRYABLE_STATUS_CODES
+            and attempt < self.max_retries
+        ):
+            wait = self.backoff(attempt)
+        else:
+            raise GoCardlessAPIError(operation, text, status_code=status_code)
+
+        logger.warning(
+            "GoCardless %s got %s, retrying in %.1fs", operation, status_code, wait
+        )
+        return wait
+
+
+class RequestAttempts:
+    """
+    The retry decisions of a single request, shared by both clients.
+
+    The clients only send the request and sleep for the waits returned here.
+    Raises like `RetryPolicy` once the request can't be retried.
+    """
+
+    def __init__(self, request: "ApiRequest[Any]", retry_policy: RetryPolicy) -> None:
+        self.request = request
+        self.retry_policy = retry_policy
+        self.idempotent = request.method == "GET"
+        self.attempt = 0
+        self._token_cleared = False
+
+    def wait_after_error(self, error: Exception, connect_failed: bool) -> float:
+        # Only a failed connect is known not to have reached the API
+        wait = self.retry_policy.wait_after_error(
+            self.request.operation,
+            error,
+            self.idempotent or connect_failed,
+            self.attempt,
+        )
+        self.attempt += 1
+        return wait
+
+    def succeeded(self, status_code: int, headers: Mapping[str, str]) -> bool:
+        """Whether the response is successful, it's recorded against the quota."""
+        success = 200 <= status_code < 300
+
+        if self.request.account_endpoint:
+            record_account_response(self.request.account_endpoint, success, headers)
+
+        return success
+
+    def wait_after_failure(
+        self, status_code: int, headers: Mapping[str, str], text: str
+    ) -> float:
+        if (
+            status_code == 401
+            and self.request.authenticated
+            and not self._token_cleared
+        ):
+            # The cached token may have been revoked before its expiry
+            clear_token()
+            self._token_cleared = True
+            return 0
+
+        wait = self.retry_policy.wait_after_response(
+            self.request.operation,
+            status_code,
+            headers,
+            text,
+            self.idempotent,
+            self.attempt,
         )
+        self.attempt += 1
+        return wait
+
+
+# ---- Shared cache of tokens and institutions ----
+
+
+def get_cached_token() -> str | None:
+    token = redis_client.get(f"{settings.REDIS_PREFIX}gocardless:token")
+    return token if isinstance(token, str) and token else None
+
+
+def get_cached_token_and_ttl() -> tuple[str | None, float]:
+    """The cached access token and the seconds until it expires from the cache."""
+    pipeline = redis_client.pipeline()
+    pipeline.get(f"{settings.REDIS_PREFIX}gocardless:token")
+    pipeline.ttl(f"{settings.REDIS_PREFIX}gocardless:token")
+    token, ttl = pipeline.execute()
+
+    if not isinstance(token, str) or not token:
+        return None, 0
+
+    return token, ttl
 
-    token = TokenResponse.model_validate_json(response.text)
+
+def get_cached_refresh_token() -> str | None:
+    token = redis_client.get(f"{settings.REDIS_PREFIX}gocardless:refresh_token")
+    return token if isinstance(token, str) and token else None
+
+
+def store_access_token(access: str, access_expires: int) -> None:
     redis_client.set(
         f"{settings.REDIS_PREFIX}gocardless:token",
-        token.access,
-        token.access_expires - TOKEN_EXPIRY_BUFFER,
+        access,
+        access_expires - TOKEN_EXPIRY_BUFFER,
     )
 
+
+def store_refresh_token(refresh: str, refresh_expires: int) -> None:
     redis_client.set(
         f"{settings.REDIS_PREFIX}gocardless:refresh_token",
-        token.refresh,
-        token.refresh_expires - TOKEN_EXPIRY_BUFFER,
+        refresh,
+        refresh_expires - TOKEN_EXPIRY_BUFFER,
     )
 
-    return token.access
 
+def clear_token() -> None:
+    redis_client.delete(f"{settings.REDIS_PREFIX}gocardless:token")
 
-def get_institutions(country: str | None = None) -> list[Institution]:
-    value = redis_client.get(
-        f"{settings.REDIS_PREFIX}gocardless:institutions"
-        f"{f':{country}' if country else ''}"
+
+def token_lock() -> Lock:
+    """The lock held by the one process fetching a new access token."""
+    return redis_client.lock(
+        f"{settings.REDIS_PREFIX}gocardless:token_lock", timeout=TOKEN_LOCK_TIMEOUT
     )
 
-    if value:
-        return InstitutionsResponse.validate_json(value)
 
-    token = get_token()
-    response = requests.get(
-        f"{GOCARDLESS_URL}/institutions/",
-        headers={"Authorization": f"Bearer {token}"},
-        params={"country": country} if country else None,
-    )
+def release_token_lock(lock: Lock) -> None:
+    # It has expired if fetching the token took longer than the timeout
+    with suppress(LockError):
+        lock.release()
+
+
+def get_current_token() -> str | None:
+    """The cached access token, refreshed in the background when about to expire."""
+    token, ttl = get_cached_token_and_ttl()
+
+    if token and ttl < settings.GOCARDLESS_TOKEN_REFRESH_AHEAD:
+        # A thread, so the refresh isn't cut short when an event loop closes
+        get_client().refresh_token_in_background()
+
+    return token
+
+
+class TokenWait:
+    """
+    Waits for a new access token, shared by both clients.
 
-    if not response.ok:
-        raise GoCardlessAPIError(
-            "fetch institutions",
-            response.text,
-            status_code=response.status_code,
+    Only the holder of the token lock calls the token endpoints, the others
+    poll the cache until the token is stored. After `GOCARDLESS_TOKEN_WAIT`
+    seconds they give up waiting and fetch one themselves. The lock is
+    released on exit:
+
+        with TokenWait() as wait:
+            while not wait.done():
+                sleep(TOKEN_LOCK_POLL_INTERVAL)
+
+            return wait.token or fetch(token_request())
+    """
+
+    def __init__(self) -> None:
+        self.token: str | None = None
+        self._lock = token_lock()
+        self._locked = False
+        self._deadline = time.monotonic() + settings.GOCARDLESS_TOKEN_WAIT
+
+    def done(self) -> bool:
+        """Whether to stop waiting, `token` is set if another process stored one."""
+        if self._lock.acquire(blocking=False):
+            self._locked = True
+            # It may have been stored between the cache miss and the lock
+            self.token = get_cached_token()
+            return True
+
+        self.token = get_cached_token()
+
+        if self.token:
+            return True
+
+        if time.monotonic() >= self._deadline:
+            logger.warning("Timed out waiting for the GoCardless token")
+            return True
+
+        return False
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        if self._locked:
+            release_token_lock(self._lock)
+
+
+INSTITUTIONS_KEY = f"{settings.REDIS_PREFIX}gocardless:institutions"
+
+# Seconds the in-process caches keep institutions before checking Redis again
+INSTITUTIONS_LOCAL_TTL = 60 * 5
+# Seconds between reloads of the in-process copy by `warm_institutions`, which
+# keeps it from expiring on the request path
+INSTITUTIONS_LOCAL_RELOAD_INTERVAL = 60 * 4
+
+# Countries' institution lists, "" for all of them, and institutions by ID
+_institution_lists: TTLCache[str, list[Institution]] = TTLCache(
+    64, INSTITUTIONS_LOCAL_TTL
+)
+_institutions: TTLCache[str, Institution] = TTLCache(20_000, INSTITUTIONS_LOCAL_TTL)
+
+
+def _institution_key(institution_id: str) -> str:
+    return f"{INSTITUTIONS_KEY}:id:{institution_id}"
+
+
+def _get_with_age(key: str) -> tuple[str | None, float]:
+    """A cached institution value, and the seconds since it was stored."""
+    pipeline = redis_client.pipeline()
+    pipeline.get(key)
+    pipeline.ttl(key)
+    value, ttl = pipeline.execute()
+
+    if not value:
+        return None, 0
+
+    return value, settings.GOCARDLESS_INSTITUTIONS_CACHE_TTL - ttl
+
+
+# Digest of the JSON the in-process list was loaded from, and the list
+_loaded_institutions: tuple[bytes, list[Institution]] | None = None
+
+
+def _digest(value: str | bytes) -> bytes:
+    if isinstance(value, str):
+        value = value.encode()
+
+    return hashlib.blake2b(value, digest_size=16).digest()
+
+
+def get_cached_institutions() -> list[Institution] | None:
+    """
+    All institutions, from the in-process cache or Redis.
+
+    They're kept in Redis for `GOCARDLESS_INSTITUTIONS_CACHE_TTL` but refreshed
+    in the background once older than `GOCARDLESS_INSTITUTIONS_REFRESH_AFTER`,
+    so only the very first fetch is made while a request waits.
+    """
+    institutions = _institution_lists.get("")
+
+    if institutions is not None:
+        return institutions
+
+    return load_cached_institutions()
+
+
+def load_cached_institutions() -> list[Institution] | None:
+    """
+    Reload the in-process copy of all institutions from Redis.
+
+    The list is only validated again when it changed, otherwise the loaded one
+    is kept, so indexes built from it stay current.
+    """
+    global _loaded_institutions
+
+    value, age = _get_with_age(INSTITUTIONS_KEY)
+
+    if value is None:
+        return None
+
+    digest = _digest(value)
+    loaded = _loaded_institutions
+
+    if loaded is not None and loaded[0] == digest:
+        institutions = loaded[1]
+    else:
+        institutions = InstitutionsResponse.validate_json(value)
+        _loaded_institutions = (digest, institutions)
+        # Lists of countries are filtered from the previous one
+        _institution_lists.clear()
+
+    _cache_institutions_locally(institutions)
+
+    if age > settings.GOCARDLESS_INSTITUTIONS_REFRESH_AFTER:
+        refresh_in_background(
+            INSTITUTIONS_KEY, lambda: get_client().fetch(institutions_request())
         )
 
-    institutions = InstitutionsResponse.validate_json(response.text)
-    redis_client.set(
-        f"{settings.REDIS_PREFIX}gocardless:institutions"
-        f"{f':{country}' if country else ''}",
-        InstitutionsResponse.dump_json(institutions),
-        60 * 60 * 24,
-    )
     return institutions
 
 
-def get_institution(institution_id: str) -> Institution:
-    value = redis_client.get(
-        f"{settings.REDIS_PREFIX}gocardless:institutions:id:{institution_id}"
-    )
+def store_institutions(institutions: list[Institution]) -> None:
+    """Cache all institutions, and each of them by ID."""
+    global _loaded_institutions
 
-    if value:
-        return Institution.model_validate_json(value)
+    value = InstitutionsResponse.dump_json(institutions)
+    pipeline = redis_client.pipeline()
+    pipeline.set(INSTITUTIONS_KEY, value, settings.GOCARDLESS_INSTITUTIONS_CACHE_TTL)
+
+    for institution in institutions:
+        pipeline.set(
+            _institution_key(institution.id),
+            institution.model_dump_json(),
+            settings.GOCARDLESS_INSTITUTIONS_CACHE_TTL,
+        )
+
+    pipeline.execute()
+    _loaded_institutions = (_digest(value), institutions)
+    _institution_lists.clear()
+    _cache_institutions_locally(institutions)
+
+
+def _cache_institutions_locally(institutions: list[Institution]) -> None:
+    _institution_lists.set("", institutions)
+
+    for institution in institutions:
+        _institutions.set(institution.id, institution)
 
-    token = get_token()
-    response = requests.get(
-        f"{GOCARDLESS_URL}/institutions/{institution_id}/",
-        headers={"Authorization": f"Bearer {token}"},
-    )
 
-    if not response.ok:
-        raise GoCardlessAPIError(
-            "fetch institution",
-            response.text,
-            status_code=response.status_code,
+def get_cached_institution(institution_id: str) -> Institution | None:
+    """An institution from the in-process cache or Redis, see above."""
+    institution = _institutions.get(institution_id)
+
+    if institution is not None:
+        return institution
+
+    value, age = _get_with_age(_institution_key(institution_id))
+
+    if value is None:
+        return None
+
+    institution = Institution.model_validate_json(value)
+    _institutions.set(institution_id, institution)
+
+    if age > settings.GOCARDLESS_INSTITUTIONS_REFRESH_AFTER:
+        refresh_in_background(
+            _institution_key(institution_id),
+            lambda: get_client().fetch(institution_request(institution_id)),
         )
 
-    institution = Institution.model_validate_json(response.text)
+    return institution
+
+
+def store_institution(institution: Institution) -> None:
     redis_client.set(
-        f"{settings.REDIS_PREFIX}gocardless:institutions:id:{institution_id}",
-        Institution.model_dump_json(institution),
-        60 * 60 * 24,
+        _institution_key(institution.id),
+        institution.model_dump_json(),
+        settings.GOCARDLESS_INSTITUTIONS_CACHE_TTL,
     )
+    _institutions.set(institution.id, institution)
+
+
+_refresh_guard = threading.Lock()
+_next_refresh_at: dict[str, float] = {}
+
+
+def refresh_in_background(key: str, fetch: Callable[[], object]) -> None:
+    """
+    Refetch the cached `key` off the request path.
+
+    Each process starts at most one refresh of a key every
+    `REFRESH_RETRY_INTERVAL` seconds, and only one process refreshes it
+    at a time.
+    """
+    with _refresh_guard:
+        if time.monotonic() < _next_refresh_at.get(key, 0):
+            return
+
+        _next_refresh_at[key] = time.monotonic() + REFRESH_RETRY_INTERVAL
+
+    def refresh() -> None:
+        try:
+            if not redis_client.set(
+                f"{key}:refreshing", 1, ex=REFRESH_LOCK_TIMEOUT, nx=True
+            ):
+                return
+
+            try:
+                fetch()
+            finally:
+                redis_client.delete(f"{key}:refreshing")
+        except Exception:
+            logger.exception("Refreshing %s failed", key)
+
+    threading.Thread(target=refresh, name="gocardless-refresh", daemon=True).start()
+
+
+def warm_institutions(on_loaded: Callable[[], object] | None = None) -> None:
+    """
+    Load the institutions in the background, e.g. when the API starts.
+
+    The in-process copy is then reloaded every
+    `INSTITUTIONS_LOCAL_RELOAD_INTERVAL` seconds, before it expires, so requests
+    don't wait for it. `on_loaded` runs after each load, e.g. to build an index.
+    """
+
+    def warm() -> None:
+        while True:
+            try:
+                if load_cached_institutions() is None:
+                    get_client().fetch(institutions_request())
+
+                if on_loaded is not None:
+                    on_loaded()
+            except Exception:
+                logger.exception("Loading the GoCardless institutions failed")
+
+            time.sleep(INSTITUTIONS_LOCAL_RELOAD_INTERVAL)
+
+    threading.Thread(target=warm, name="gocardless-warm", daemon=True).start()
+
+
+# ---- Requests ----
+
+
+class ApiRequest(NamedTuple, Generic[T]):
+    """A GoCardless API request, and how to parse its successful response."""
+
+    method: str
+    path: str
+    operation: str
+    parse: Callable[[str], T]
+    authenticated: bool = True
+    # Calls to a per-account endpoint are recorded against the account's quota
+    account_endpoint: tuple[str, AccountEndpoint] | None = None
+    params: dict[str, str] | None = None
+    data: dict[str, str] | None = None
+    json: dict[str, Any] | None = None
+
+
+def _store_refreshed_token(text: str) -> str:
+    refreshed = RefreshResponse.model_validate_json(text)
+    store_access_token(refreshed.access, refreshed.access_expires)
+    return refreshed.access
+
+
+def _store_new_token(text: str) -> str:
+    new_token = TokenResponse.model_validate_json(text)
+    store_access_token(new_token.access, new_token.access_expires)
+    store_refresh_token(new_token.refresh, new_token.refresh_expires)
+    return new_token.access
+
+
+def token_request() -> ApiRequest[str]:
+    """Fetch and cache a new access token, using the refresh token if cached."""
+    refresh_token = get_cached_refresh_token()
+
+    if refresh_token:
+        return ApiRequest(
+            "POST",
+            "/token/refresh/",
+            "refresh GoCardless token",
+            _store_refreshed_token,
+            authenticated=False,
+            data={"refresh": refresh_token},
+        )
+
+    return ApiRequest(
+        "POST",
+        "/token/new/",
+        "create GoCardless token",
+        _store_new_token,
+        authenticated=False,
+        data={
+            "secret_id": settings.GOCARDLESS_SECRET_ID,
+            "secret_key": settings.GOCARDLESS_SECRET_KEY,
+        },
+    )
+
+
+def _store_institutions(text: str) -> list[Institution]:
+    institutions = InstitutionsResponse.validate_json(text)
+    store_institutions(institutions)
+    return institutions
+
+
+def institutions_request() -> ApiRequest[list[Institution]]:
+    return ApiRequest(
+        "GET", "/institutions/", "fetch institutions", _store_institutions
+    )
+
+
+def _store_institution(text: str) -> Institution:
+    institution = Institution.model_validate_json(text)
+    store_institution(institution)
     return institution
 
 
-def create_requisition(
+def institution_request(institution_id: str) -> ApiRequest[Institution]:
+    return ApiRequest(
+        "GET",
+        f"/institutions/{institution_id}/",
+        "fetch institution",
+        _store_institution,
+    )
+
+
+def create_requisition_request(
     institution_id: str, redirect_url: str
-) -> CreateRequisitionResponse:
-    token = get_token()
-    response = requests.post(
-        f"{GOCARDLESS_URL}/requisitions/",
-        headers={"Authorization": f"Bearer {token}"},
+) -> ApiRequest[CreateRequisitionResponse]:
+    return ApiRequest(
+        "POST",
+        "/requisitions/",
+        "create requisition",
+        CreateRequisitionResponse.model_validate_json,
         json={
             "institution_id": institution_id,
             "redirect": redirect_url,
         },
     )
 
-    if not response.ok:
-        raise GoCardlessAPIError(
-            "create requisition",
-            response.text,
-            status_code=response.status_code,
-        )
 
-    return CreateRequisitionResponse.model_validate_json(response.text)
+def requisition_request(requisition_id: str) -> ApiRequest[GetRequisitionResponse]:
+    return ApiRequest(
+        "GET",
+        f"/requisitions/{requisition_id}/",
+        "fetch accounts",
+        GetRequisitionResponse.model_validate_json,
+    )
 
 
-def get_requisition(requisition_id: str) -> GetRequisitionResponse:
-    token = get_token()
-    response = requests.get(
-        f"{GOCARDLESS_URL}/requisitions/{requisition_id}/",
-        headers={"Authorization": f"Bearer {token}"},
+def _store_account_details(account_id: str, text: str) -> AccountDetails:
+    details = AccountDetailsResponse.model_validate_json(text).account
+    store_account_details(account_id, details)
+    return details
+
+
+def account_details_request(account_id: str) -> ApiRequest[AccountDetails]:
+    return ApiRequest(
+        "GET",
+        f"/accounts/{account_id}/details/",
+        "fetch account details",
+        partial(_store_account_details, account_id),
+        account_endpoint=(account_id, "details"),
     )
 
-    if not response.ok:
-        raise GoCardlessAPIError(
-            "fetch accounts",
-            response.text,
-            status_code=response.status_code,
-        )
 
-    return GetRequisitionResponse.model_validate_json(response.text)
+def _parse_transactions(text: str) -> TransactionsContainer:
+    return TransactionsResponse.model_validate_json(text).transactions
 
 
-def get_account_details(account_id: str) -> AccountDetails:
-    token = get_token()
-    response = requests.get(
-        f"{GOCARDLESS_URL}/accounts/{account_id}/details/",
-        headers={"Authorization": f"Bearer {token}"},
+def transactions_request(
+    account_id: str, date_from: date | None = None
+) -> ApiRequest[TransactionsContainer]:
+    """The account's transactions, booked on `date_from` or later if given."""
+    return ApiRequest(
+        "GET",
+        f"/accounts/{account_id}/transactions/",
+        "fetch transactions",
+        _parse_transactions,
+        account_endpoint=(account_id, "transactions"),
+        params={"date_from": date_from.isoformat()} if date_from else None,
     )
 
-    if not response.ok:
-        raise GoCardlessAPIError(
-            "fetch account details",
-            response.text,
-            status_code=response.status_code,
+
+@contextmanager
+def transactions_download() -> Iterator[IO[bytes]]:
+    """
+    A temporary file to download transactions to, see `iter_booked_transactions`.
+
+    It's closed should the download fail, otherwise once the transactions
+    have been iterated.
+    """
+    body = spool_file()
+
+    try:
+        yield body
+    except BaseException:
+        body.close()
+        raise
+
+
+class GoCardlessClient:
+    """
+    Client for the GoCardless bank account data API.
+
+    Requests share a pooled session, have timeouts and are retried according
+    to `retry_policy`.
+    """
+
+    def __init__(
+        self,
+        base_url: str = settings.GOCARDLESS_URL,
+        session: requests.Session | None = None,
+        timeout: tuple[float, float] = (
+            settings.GOCARDLESS_CONNECT_TIMEOUT,
+            settings.GOCARDLESS_TIMEOUT,
+        ),
+        retry_policy: RetryPolicy | None = None,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.retry_policy = retry_policy or RetryPolicy()
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=settings.GOCARDLESS_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+
+        self.session = session
+        self._next_refresh_at = 0.0
+        self._refresh_guard = threading.Lock()
+
+    def request(
+        self, request: ApiRequest[Any], download_to: IO[bytes] | None = None
+    ) -> requests.Response:
+        """
+        Send a request and return the successful response.
+
+        Raises `GoCardlessRateLimitError` when the API asks to wait longer than
+        the retry policy allows, and `GoCardlessAPIError` for any other failure.
+        With `download_to`, a successful response's body is written to that
+        file instead of kept in memory.
+        """
+        attempts = RequestAttempts(request, self.retry_policy)
+
+        while True:
+            headers = {}
+            if request.authenticated:
+                headers["Authorization"] = f"Bearer {self.get_token()}"
+
+            try:
+                response = self.session.request(
+                    request.method,
+                    f"{self.base_url}{request.path}",
+                    headers=headers,
+                    timeout=self.timeout,
+                    stream=download_to is not None,
+                    params=request.params,
+                    data=request.data,
+                    json=request.json,
+                )
+
+                if download_to is not None and response.ok:
+                    download_to.seek(0)
+                    download_to.truncate()
+
+                    for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                        download_to.write(chunk)
+            except requests.RequestException as e:
+                wait = attempts.wait_after_error(
+                    e, isinstance(e, requests.ConnectTimeout)
+                )
+            else:
+                if attempts.succeeded(response.status_code, response.headers):
+                    return response
+
+                wait = attempts.wait_after_failure(
+                    response.status_code, response.headers, response.text
+                )
+
+            time.sleep(wait)
+
+    def fetch(self, request: ApiRequest[T]) -> T:
+        """Send a request and return its parsed response, see `request`."""
+        return request.parse(self.request(request).text)
+
+    # ---- Authentication ----
+
+    def get_token(self) -> str:
+        return get_current_token() or self.acquire_token()
+
+    def acquire_token(self) -> str:
+        """Fetch a new access token, or wait for the process already fetching one."""
+        with TokenWait() as wait:
+            while not wait.done():
+                time.sleep(TOKEN_LOCK_POLL_INTERVAL)
+
+            return wait.token or self.fetch(token_request())
+
+    def refresh_token_in_background(self) -> None:
+        """Replace the cached access token before it expires, off the request path."""
+        with self._refresh_guard:
+            if time.monotonic() < self._next_refresh_at:
+                return
+
+            self._next_refresh_at = time.monotonic() + REFRESH_RETRY_INTERVAL
+
+        threading.Thread(
+            target=self._refresh_token, name="gocardless-token-refresh", daemon=True
+        ).start()
+
+    def _refresh_token(self) -> None:
+        lock = token_lock()
+
+        try:
+            # Another process is already fetching one
+            if not lock.acquire(blocking=False):
+                return
+
+            try:
+                _, ttl = get_cached_token_and_ttl()
+
+                # Unless another process has refreshed it in the meantime
+                if ttl < settings.GOCARDLESS_TOKEN_REFRESH_AHEAD:
+                    self.fetch(token_request())
+            finally:
+                release_token_lock(lock)
+        except Exception:
+            logger.exception("Refreshing the GoCardless token failed")
+
+    # ---- Institutions ----
+
+    def get_institutions(self, country: str | None = None) -> list[Institution]:
+        """All institutions, or those available in `country`."""
+        key = country.upper() if country else ""
+        institutions = _institution_lists.get(key)
+
+        if institutions is not None:
+            return institutions
+
+        institutions = get_cached_institutions()
+
+        # An empty list is cached too, it's only missing when it's None
+        if institutions is None:
+            institutions = self.fetch(institutions_request())
+
+        if key:
+            institutions = [
+                institution
+                for institution in institutions
+                if key in institution.countries
+            ]
+            _institution_lists.set(key, institutions)
+
+        return institutions
+
+    def get_institution(self, institution_id: str) -> Institution:
+        return get_cached_institution(institution_id) or self.fetch(
+            institution_request(institution_id)
         )
 
-    return AccountDetailsResponse.model_validate_json(response.text).account
+    # ---- Requisitions and accounts ----
 
+    def create_requisition(
+        self, institution_id: str, redirect_url: str
+    ) -> CreateRequisitionResponse:
+        return self.fetch(create_requisition_request(institution_id, redirect_url))
 
-def get_transactions(account_id: str) -> TransactionsContainer:
-    token = get_token()
-    response = requests.get(
-        f"{GOCARDLESS_URL}/accounts/{account_id}/transactions/",
-        headers={"Authorization": f"Bearer {token}"},
-    )
+    def get_requisition(self, requisition_id: str) -> GetRequisitionResponse:
+        return self.fetch(requisition_request(requisition_id))
+
+    def get_account_details(self, account_id: str) -> AccountDetails:
+        return self.fetch(account_details_request(account_id))
+
+    def get_transactions(
+        self, account_id: str, date_from: date | None = None
+    ) -> TransactionsContainer:
+        """The account's transactions, booked on `date_from` or later if given."""
+        return self.fetch(transactions_request(account_id, date_from))
+
+    def iter_transactions(
+        self, account_id: str, date_from: date | None = None
+    ) -> Iterator[Transaction]:
+        """
+        The account's booked transactions, see `get_transactions`.
+
+        The response is downloaded to a temporary file and parsed one
+        transaction at a time, so memory use doesn't grow with the history.
+        """
+        with transactions_download() as body:
+            self.request(transactions_request(account_id, date_from), body)
+
+        return iter_booked_transactions(body)
+
+
+_client: GoCardlessClient | None = None
+
+
+def get_client() -> GoCardlessClient:
+    global _client
+
+    if _client is None:
+        _client = GoCardlessClient()
+
+    return _client
+
+
+def set_client(client: GoCardlessClient | None) -> None:
+    """Replace the client used by the functions below, e.g. with a fake server's."""
+    global _client
+    _client = client
+
+
+def get_token() -> str:
+    return get_client().get_token()
+
+
+def get_institutions(country: str | None = None) -> list[Institution]:
+    return get_client().get_institutions(country)
+
+
+def get_institution(institution_id: str) -> Institution:
+    return get_client().get_institution(institution_id)
+
+
+def create_requisition(
+    institution_id: str, redirect_url: str
+) -> CreateRequisitionResponse:
+    return get_client().create_requisition(institution_id, redirect_url)
+
+
+def get_requisition(requisition_id: str) -> GetRequisitionResponse:
+    return get_client().get_requisition(requisition_id)
+
+
+def get_account_details(account_id: str) -> AccountDetails:
+    return get_client().get_account_details(account_id)
+
+
+def get_transactions(
+    account_id: str, date_from: date | None = None
+) -> TransactionsContainer:
+    return get_client().get_transactions(account_id, date_from)
 
-    if not response.ok:
-        raise GoCardlessAPIError(
-            "fetch transactions",
-            response.text,
-            status_code=response.status_code,
-        )
 
-    return TransactionsResponse.model_validate_json(response.text).transactions
+def iter_transactions(
+    account_id: str, date_from: date | None = None
+) -> Iterator[Transaction]:
+    return get_client().iter_transactions(account_id, date_from)
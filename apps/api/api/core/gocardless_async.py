@@ -0,0 +1,258 @@
+"""
+Asyncio variant of the GoCardless client, for fetching many accounts at once.
+
+It shares the requests, the token and institution cache and the retry
+decisions with `api.core.gocardless`, only the transport I/O is its own.
+"""
+
+import asyncio
+import logging
+from collections.abc import Callable, Iterator, Mapping
+from datetime import date
+from types import TracebackType
+from typing import IO, Any, NamedTuple, Self, TypeVar
+
+import httpx
+
+from api.core.config import settings
+from api.core.gocardless import (
+    DOWNLOAD_CHUNK_SIZE,
+    TOKEN_LOCK_POLL_INTERVAL,
+    ApiRequest,
+    RequestAttempts,
+    RetryPolicy,
+    TokenWait,
+    account_details_request,
+    get_cached_institution,
+    get_cached_token,
+    get_current_token,
+    institution_request,
+    iter_booked_transactions,
+    token_request,
+    transactions_download,
+    transactions_request,
+)
+from api.schemas.gocardless import AccountDetails, Institution, Transaction
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class AccountData(NamedTuple):
+    details: AccountDetails
+    # Booked transactions, parsed from a temporary file as they're iterated
+    transactions: Iterator[Transaction]
+
+
+class AsyncGoCardlessClient:
+    """
+    Async client for the GoCardless bank account data API.
+
+    At most `concurrency` requests are in flight at once. Use it as an async
+    context manager, the connections are closed on exit.
+    """
+
+    def __init__(
+        self,
+        base_url: str = settings.GOCARDLESS_URL,
+        concurrency: int = settings.GOCARDLESS_CONCURRENCY,
+        timeout: tuple[float, float] = (
+            settings.GOCARDLESS_CONNECT_TIMEOUT,
+            settings.GOCARDLESS_TIMEOUT,
+        ),
+        retry_policy: RetryPolicy | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        connect_timeout, read_timeout = timeout
+        self.client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=concurrency),
+            transport=transport,
+        )
+        self.retry_policy = retry_policy or RetryPolicy()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # Concurrent requests share a single token fetch
+        self._token_lock = asyncio.Lock()
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        await self.client.aclose()
+
+    async def request(
+        self, request: ApiRequest[Any], download_to: IO[bytes] | None = None
+    ) -> httpx.Response:
+        """Send a request and return the successful response, see `GoCardlessClient`."""
+        attempts = RequestAttempts(request, self.retry_policy)
+
+        while True:
+            headers = {}
+            if request.authenticated:
+                headers["Authorization"] = f"Bearer {await self.get_token()}"
+
+            try:
+                async with self._semaphore:
+                    response = await self._send(request, headers, download_to)
+            except httpx.TransportError as e:
+                wait = attempts.wait_after_error(
+                    e, isinstance(e, httpx.ConnectError | httpx.ConnectTimeout)
+                )
+            else:
+                if attempts.succeeded(response.status_code, response.headers):
+                    return response
+
+                wait = attempts.wait_after_failure(
+                    response.status_code, response.headers, response.text
+                )
+
+            await asyncio.sleep(wait)
+
+    async def _send(
+        self,
+        request: ApiRequest[Any],
+        headers: dict[str, str],
+        download_to: IO[bytes] | None,
+    ) -> httpx.Response:
+        async with self.client.stream(
+            request.method,
+            request.path,
+            headers=headers,
+            params=request.params,
+            data=request.data,
+            json=request.json,
+        ) as response:
+            if download_to is None or not response.is_success:
+                await response.aread()
+                return response
+
+            download_to.seek(0)
+            download_to.truncate()
+
+            async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                download_to.write(chunk)
+
+            return response
+
+    async def fetch(self, request: ApiRequest[T]) -> T:
+        """Send a request and return its parsed response, see `request`."""
+        return request.parse((await self.request(request)).text)
+
+    async def get_token(self) -> str:
+        token = get_current_token()
+
+        if token:
+            return token
+
+        async with self._token_lock:
+            # Another request may have fetched it while we waited for the lock
+            return get_cached_token() or await self.acquire_token()
+
+    async def acquire_token(self) -> str:
+        """Fetch a new access token, see `GoCardlessClient.acquire_token`."""
+        with TokenWait() as wait:
+            while not wait.done():
+                await asyncio.sleep(TOKEN_LOCK_POLL_INTERVAL)
+
+            if wait.token:
+                return wait.token
+
+            return await self.fetch(token_request())
+
+    async def get_institution(self, institution_id: str) -> Institution:
+        institution = get_cached_institution(institution_id)
+
+        if institution:
+            return institution
+
+        return await self.fetch(institution_request(institution_id))
+
+    async def get_account_details(self, account_id: str) -> AccountDetails:
+        return await self.fetch(account_details_request(account_id))
+
+    async def iter_transactions(
+        self, account_id: str, date_from: date | None = None
+    ) -> Iterator[Transaction]:
+        """Download the account's booked transactions, see `GoCardlessClient`."""
+        with transactions_download() as body:
+            await self.request(transactions_request(account_id, date_from), body)
+
+        return iter_booked_transactions(body)
+
+    async def get_account_data(
+        self,
+        account_id: str,
+        date_from: date | None = None,
+        details: AccountDetails | None = None,
+    ) -> AccountData:
+        """The account's details and transactions, pass `details` to reuse them."""
+        if details is not None:
+            return AccountData(
+                details, await self.iter_transactions(account_id, date_from)
+            )
+
+        return AccountData(
+            *await asyncio.gather(
+                self.get_account_details(account_id),
+                self.iter_transactions(account_id, date_from),
+            )
+        )
+
+
+_client_factory: Callable[[], AsyncGoCardlessClient] = AsyncGoCardlessClient
+
+
+def create_async_client() -> AsyncGoCardlessClient:
+    """A new client, clients can't be shared between event loops."""
+    return _client_factory()
+
+
+def set_async_client_factory(
+    factory: Callable[[], AsyncGoCardlessClient] | None,
+) -> None:
+    """Replace how clients are created, e.g. to point them at a fake server."""
+    global _client_factory
+    _client_factory = factory or AsyncGoCardlessClient
+
+
+async def fetch_accounts(
+    account_ids: list[str],
+    institution_id: str,
+    date_from: Mapping[str, date] | None = None,
+    cached_details: Mapping[str, AccountDetails] | None = None,
+) -> tuple[Institution, dict[str, AccountData | BaseException]]:
+    """
+    Fetch the institution and the details and transactions of every account.
+
+    The accounts are fetched concurrently, those in `date_from` only their
+    transactions from that date on, and those in `cached_details` only their
+    transactions. Each maps to its data, or to the exception that fetching it
+    raised.
+    """
+    date_from = date_from or {}
+    cached_details = cached_details or {}
+
+    async with create_async_client() as client:
+        institution, results = await asyncio.gather(
+            client.get_institution(institution_id),
+            asyncio.gather(
+                *(
+                    client.get_account_data(
+                        account_id,
+                        date_from.get(account_id),
+                        cached_details.get(account_id),
+                    )
+                    for account_id in account_ids
+                ),
+                return_exceptions=True,
+            ),
+        )
+
+    return institution, dict(zip(account_ids, results, strict=True))
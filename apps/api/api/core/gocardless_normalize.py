@@ -0,0 +1,97 @@
+"""
+Maps GoCardless transactions straight to the rows upserted into `transaction`.
+
+Building a `Transaction` model per row only to dump it again costs more than
+the rest of the import, so rows are built as plain dicts here.
+"""
+
+import os
+from datetime import datetime
+from typing import Any
+
+from nanoid.resources import alphabet, size
+
+from api.core.exceptions import TransactionMissingDataError
+from api.models.enums.transaction import ProcessingStatus
+from api.schemas.gocardless import Transaction as GoCardlessTransaction
+
+# The default nanoid alphabet has 64 characters, so nanoid maps each random
+# byte to the character at its low 6 bits, the same is done here in one call
+# (tests/test_gocardless_normalize.py checks the alphabet's length)
+_ID_TABLE = bytes(ord(alphabet[byte & 63]) for byte in range(256))
+
+
+def generate_id() -> str:
+    """Same as `nanoid.generate()`, a few times faster."""
+    return os.urandom(size).translate(_ID_TABLE).decode("ascii")
+
+
+class TransactionNormalizer:
+    """
+    Builds the rows of one account's transactions.
+
+    `created_at` and `updated_at` are left out, the database fills them in.
+    """
+
+    def __init__(self, account_id: str, user_id: str) -> None:
+        self.account_id = account_id
+        self.user_id = user_id
+        # Many transactions share their dates, each is only parsed once
+        self._times: dict[str, datetime] = {}
+
+    def _parse_time(self, value: str) -> datetime:
+        parsed = self._times.get(value)
+
+        if parsed is None:
+            parsed = self._times[value] = datetime.fromisoformat(value)
+
+        return parsed
+
+    def __call__(self, transaction: GoCardlessTransaction) -> dict[str, Any]:
+        transaction_amount = transaction.transactionAmount
+        native_amount = transaction_amount.amount
+
+        if native_amount < 0:
+            opposing_account = transaction.creditorAccount
+            opposing_name = transaction.creditorName
+        else:
+            opposing_account = transaction.debitorAccount
+            opposing_name = transaction.debitorName
+
+        booking_time_str = transaction.bookingDateTime or transaction.bookingDate
+
+        if not booking_time_str:
+            raise TransactionMissingDataError(transaction.transactionId, "booking date")
+
+        value_time_str = transaction.valueDateTime or transaction.valueDate
+
+        if transaction.currencyExchange:
+            instructed_amount = transaction.currencyExchange.instructedAmount
+            amount = instructed_amount.amount
+            currency = instructed_amount.currency
+
+            if native_amount < 0:
+                amount = -amount
+        else:
+            amount = native_amount
+            currency = transaction_amount.currency
+
+        return {
+            "id": generate_id(),
+            "account_id": self.account_id,
+            "user_id": self.user_id,
+            "amount": amount,
+            "currency": currency,
+            "native_amount": native_amount,
+            "processing_status": ProcessingStatus.UNPROCESSED.value,
+            "opposing_name": opposing_name,
+            "opposing_iban": opposing_account.iban if opposing_account else None,
+            "opposing_bban": opposing_account.bban if opposing_account else None,
+            "opposing_merchant_id": None,
+            "opposing_counterparty_id": None,
+            "opposing_account_id": None,
+            "gocardless_id": transaction.internalTransactionId,
+            "internal_id": transaction.transactionId,
+            "booking_time": self._parse_time(booking_time_str),
+            "value_time": self._parse_time(value_time_str) if value_time_str else None,
+        }
@@ -0,0 +1,189 @@
+"""
+Per-account budget of GoCardless bank data calls, shared through Redis.
+
+GoCardless allows only a few successful calls per account and endpoint a day.
+Every call is recorded with the allowance GoCardless reports, so imports can
+skip calls that would be rejected, reuse cached account details, and avoid
+importing an account twice at once.
+"""
+
+from collections.abc import Iterable
+from typing import Literal, NamedTuple
+
+from api.core.config import settings
+from api.core.redis import redis_client
+from api.schemas.gocardless import AccountDetails
+
+AccountEndpoint = Literal["details", "transactions"]
+
+# Used as the window when GoCardless doesn't say when the allowance resets
+QUOTA_WINDOW = 60 * 60 * 24
+
+# KEYS[1] is the account and endpoint's budget. ARGV are the remaining calls
+# and the seconds until they reset as reported by GoCardless, empty when not
+# reported, and whether the call succeeded.
+RECORD_CALL_SCRIPT = """
+if ARGV[3] == '1' then
+    redis.call('HINCRBY', KEYS[1], 'used', 1)
+end
+
+if ARGV[1] ~= '' then
+    redis.call('HSET', KEYS[1], 'remaining', ARGV[1])
+elseif ARGV[3] == '1' and redis.call('HEXISTS', KEYS[1], 'remaining') == 1 then
+    redis.call('HINCRBY', KEYS[1], 'remaining', -1)
+end
+
+if ARGV[2] ~= '' then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+elseif redis.call('TTL', KEYS[1]) < 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[4])
+end
+"""
+
+_record_call = redis_client.register_script(RECORD_CALL_SCRIPT)
+
+
+class Quota(NamedTuple):
+    used: int
+    # None until GoCardless has reported it
+    remaining: int | None
+    reset_in: int  # seconds
+
+    @property
+    def exhausted(self) -> bool:
+        return self.remaining is not None and self.remaining <= 0
+
+
+def _quota_key(account_id: str, endpoint: AccountEndpoint) -> str:
+    return f"{settings.REDIS_PREFIX}gocardless:quota:{endpoint}:{account_id}"
+
+
+def record_account_call(
+    account_id: str,
+    endpoint: AccountEndpoint,
+    success: bool,
+    remaining: float | None,
+    reset_in: float | None,
+) -> None:
+    """Record a call, with the remaining calls and reset GoCardless reported."""
+    _record_call(
+        keys=[_quota_key(account_id, endpoint)],
+        args=[
+            "" if remaining is None else int(remaining),
+            "" if reset_in is None else max(int(reset_in), 1),
+            int(success),
+            QUOTA_WINDOW,
+        ],
+    )
+
+
+def get_account_quotas(
+    account_ids: Iterable[str], endpoint: AccountEndpoint
+) -> dict[str, Quota]:
+    """The budget of each account that has been called in the current window."""
+    account_ids = list(account_ids)
+    pipeline = redis_client.pipeline()
+
+    for account_id in account_ids:
+        pipeline.hmget(_quota_key(account_id, endpoint), ["used", "remaining"])
+        pipeline.ttl(_quota_key(account_id, endpoint))
+
+    results = pipeline.execute()
+    quotas = {}
+
+    for account_id, (used, remaining), reset_in in zip(
+        account_ids, results[::2], results[1::2], strict=True
+    ):
+        if used is None and remaining is None:
+            continue
+
+        quotas[account_id] = Quota(
+            int(used or 0),
+            int(remaining) if remaining is not None else None,
+            max(reset_in, 0),
+        )
+
+    return quotas
+
+
+# ---- Cached account details ----
+
+
+def get_cached_account_details(
+    account_ids: Iterable[str],
+) -> dict[str, AccountDetails]:
+    account_ids = list(account_ids)
+
+    if not account_ids:
+        return {}
+
+    values = redis_client.mget(
+        [
+            f"{settings.REDIS_PREFIX}gocardless:details:{account_id}"
+            for account_id in account_ids
+        ]
+    )
+
+    return {
+        account_id: AccountDetails.model_validate_json(value)
+        for account_id, value in zip(account_ids, values, strict=True)
+        if value
+    }
+
+
+def store_account_details(account_id: str, details: AccountDetails) -> None:
+    redis_client.set(
+        f"{settings.REDIS_PREFIX}gocardless:details:{account_id}",
+        details.model_dump_json(),
+        settings.GOCARDLESS_DETAILS_CACHE_TTL,
+    )
+
+
+# ---- Imports in progress ----
+
+
+def claim_account_imports(account_ids: Iterable[str]) -> list[str]:
+    """
+    Claim the accounts for an import, returns those that weren't already.
+
+    Claims expire after `GOCARDLESS_IMPORT_CLAIM_TTL`, should the import that
+    holds them never finish.
+    """
+    account_ids = list(account_ids)
+    pipeline = redis_client.pipeline()
+
+    for account_id in account_ids:
+        pipeline.set(
+            f"{settings.REDIS_PREFIX}gocardless:importing:{account_id}",
+            1,
+            ex=settings.GOCARDLESS_IMPORT_CLAIM_TTL,
+            nx=True,
+        )
+
+    return [
+        account_id
+        for account_id, claimed in zip(account_ids, pipeline.execute(), strict=True)
+        if claimed
+    ]
+
+
+def release_account_imports(account_ids: Iterable[str]) -> None:
+    keys = [
+        f"{settings.REDIS_PREFIX}gocardless:importing:{account_id}"
+        for account_id in account_ids
+    ]
+
+    if keys:
+        redis_client.delete(*keys)
+
+
+def extend_account_imports(account_ids: Iterable[str], ttl: int) -> None:
+    """Keep the accounts claimed for `ttl` seconds, e.g. for a deferred import."""
+    pipeline = redis_client.pipeline()
+
+    for account_id in account_ids:
+        pipeline.set(
+            f"{settings.REDIS_PREFIX}gocardless:importing:{account_id}", 1, ex=ttl
+        )
+
+    pipeline.execute()
@@ -0,0 +1,132 @@
+"""
+Password hashing off the event loop.
+
+bcrypt takes 100-300 ms of CPU per hash and releases the GIL while it runs, so
+hashes are handed to a small thread pool. Callers beyond the pending limit are
+rejected instead of queueing up behind a burst of logins.
+"""
+
+import asyncio
+import threading
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TypeVar
+
+from api.core.config import settings
+from api.core.exceptions import PasswordHasherBusyError
+from api.core.metrics import Metric, register_collector
+from api.core.security import get_password_hash, verify_password
+
+T = TypeVar("T")
+
+
+class HashingPool:
+    def __init__(self, workers: int, max_pending: int) -> None:
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password-hash"
+        )
+        self._lock = threading.Lock()
+
+        self.pending = 0  # Submitted, waiting for a worker or running
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.total_seconds = 0.0
+
+    async def run(self, func: Callable[..., T], *args: object) -> T:
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHasherBusyError(self.pending)
+            self.pending += 1
+
+        submitted_at = time.perf_counter()
+
+        def task() -> T:
+            with self._lock:
+                self.running += 1
+                self.wait_seconds += time.perf_counter() - submitted_at
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self.running -= 1
+
+        def done(_: Future[T]) -> None:
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+                self.total_seconds += time.perf_counter() - submitted_at
+
+        # Counted as pending until the worker is done with it, even when the
+        # awaiting request is cancelled, as it keeps holding a worker till then
+        future = self._executor.submit(task)
+        future.add_done_callback(done)
+
+        return await asyncio.wrap_future(future)
+
+
+hashing_pool = HashingPool(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await hashing_pool.run(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await hashing_pool.run(get_password_hash, password)
+
+
+@register_collector
+def collect_hashing_metrics() -> Iterable[Metric]:
+    pool = hashing_pool
+
+    yield Metric(
+        "password_hash_queue_depth",
+        "gauge",
+        "Hashes waiting for a worker",
+        [({}, pool.pending - pool.running)],
+    )
+    yield Metric(
+        "password_hash_running",
+        "gauge",
+        "Hashes currently running",
+        [({}, pool.running)],
+    )
+    yield Metric(
+        "password_hash_workers",
+        "gauge",
+        "Configured worker threads",
+        [({}, pool.workers)],
+    )
+    yield Metric(
+        "password_hash_completed_total",
+        "counter",
+        "Hashes that finished, successfully or not",
+        [({}, pool.completed)],
+    )
+    yield Metric(
+        "password_hash_rejected_total",
+        "counter",
+        "Hashes rejected because too many were pending",
+        [({}, pool.rejected)],
+    )
+    yield Metric(
+        "password_hash_wait_seconds_total",
+        "counter",
+        "Total time hashes spent waiting for a worker",
+        [({}, pool.wait_seconds)],
+    )
+    yield Metric(
+        "password_hash_seconds_total",
+        "counter",
+        "Total time from submitting a hash to its result",
+        [({}, pool.total_seconds)],
+    )
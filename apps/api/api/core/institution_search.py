@@ -0,0 +1,136 @@
+"""
+In-memory search index over the GoCardless institutions.
+
+Names and BICs are split into normalized tokens kept in a sorted list, so the
+institutions matching a prefix are found with two binary searches.
+"""
+
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections.abc import Collection, Sequence
+
+from api.core.gocardless import get_client
+from api.schemas.gocardless import Institution
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    """Casefolded and without accents, so "Société" matches "societe"."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_PATTERN.findall(normalize(text))
+
+
+class InstitutionIndex:
+    """Prefix index over the name and BIC tokens of `institutions`."""
+
+    def __init__(self, institutions: Sequence[Institution]) -> None:
+        self.institutions = institutions
+
+        # Institutions are identified by their position in the name order, so
+        # sorting matches is sorting ints, and names with a prefix are a range
+        names = [normalize(institution.name) for institution in institutions]
+        self._order = sorted(range(len(institutions)), key=names.__getitem__)
+        self._names = [names[i] for i in self._order]
+
+        postings: dict[str, set[int]] = {}
+        countries: dict[str, set[int]] = {}
+
+        for rank, i in enumerate(self._order):
+            institution = institutions[i]
+
+            for token in (*tokenize(institution.name), *tokenize(institution.bic)):
+                postings.setdefault(token, set()).add(rank)
+
+            for country in institution.countries:
+                countries.setdefault(country.upper(), set()).add(rank)
+
+        self._tokens = sorted(postings)
+        self._postings = [frozenset(postings[token]) for token in self._tokens]
+        self._countries = {
+            country: frozenset(ranks) for country, ranks in countries.items()
+        }
+
+    @staticmethod
+    def _prefix_range(values: list[str], prefix: str) -> tuple[int, int]:
+        start = bisect_left(values, prefix)
+        return start, bisect_left(values, prefix + "\U0010ffff", start)
+
+    def _prefix_matches(self, prefix: str) -> set[int]:
+        start, end = self._prefix_range(self._tokens, prefix)
+
+        matches: set[int] = set()
+        for postings in self._postings[start:end]:
+            matches |= postings
+
+        return matches
+
+    def search(
+        self, query: str, country: str | None = None, limit: int = 20, offset: int = 0
+    ) -> tuple[int, list[Institution]]:
+        """
+        Institutions with a name or BIC token starting with every query token.
+
+        Returns the number of matches and the requested page of them. Those
+        whose name starts with the query come first, then by name.
+        """
+        tokens = tokenize(query)
+        matches: Collection[int]
+
+        if tokens:
+            # The longest token usually matches the fewest institutions
+            tokens.sort(key=len, reverse=True)
+            matches = self._prefix_matches(tokens[0])
+
+            for token in tokens[1:]:
+                if not matches:
+                    break
+
+                matches &= self._prefix_matches(token)
+
+            if country:
+                matches &= self._countries.get(country.upper(), frozenset())
+        elif country:
+            matches = self._countries.get(country.upper(), frozenset())
+        else:
+            matches = range(len(self.institutions))
+
+        ranks = sorted(matches)
+
+        # The names starting with the query are a range of ranks
+        start, end = self._prefix_range(self._names, normalize(query.strip()))
+        start, end = bisect_left(ranks, start), bisect_left(ranks, end)
+        ranks = ranks[start:end] + ranks[:start] + ranks[end:]
+
+        return len(ranks), [
+            self.institutions[self._order[rank]]
+            for rank in ranks[offset : offset + limit]
+        ]
+
+
+_index: InstitutionIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_institution_index() -> InstitutionIndex:
+    """
+    The index of the cached institutions.
+
+    It's rebuilt whenever the cached list changes, in the background where
+    `warm_institutions` keeps the list loaded.
+    """
+    global _index
+
+    institutions = get_client().get_institutions()
+
+    with _index_lock:
+        if _index is None or _index.institutions is not institutions:
+            _index = InstitutionIndex(institutions)
+
+        return _index
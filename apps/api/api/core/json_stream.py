@@ -0,0 +1,131 @@
+"""
+Incremental parsing of large JSON documents.
+
+Only the array that is iterated is parsed item by item, other values on the
+way to it are parsed whole, so they should be small.
+"""
+
+import codecs
+import json
+from collections.abc import Iterable, Iterator, Sequence
+from typing import Any
+
+# Consumed input is dropped from the buffer once it's this long
+_COMPACT_AFTER = 1 << 16
+
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = _WHITESPACE + ",]}"
+
+
+class _Reader:
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.exhausted = False
+
+    def _read_more(self) -> bool:
+        if self.exhausted:
+            return False
+
+        if self.pos > _COMPACT_AFTER:
+            self.buffer = self.buffer[self.pos :]
+            self.pos = 0
+
+        for chunk in self._chunks:
+            text = self._decoder.decode(chunk)
+
+            if text:
+                self.buffer += text
+                return True
+
+        self.buffer += self._decoder.decode(b"", final=True)
+        self.exhausted = True
+        return True
+
+    def peek(self) -> str:
+        """The next non-whitespace character, "" at the end of the input."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+
+            if not self._read_more():
+                return ""
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at offset {self.pos}")
+
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+
+        while True:
+            try:
+                value, end = self._json.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.exhausted:
+                    raise
+            else:
+                # A number may continue in the next chunk, e.g. "-3" of "-3e2"
+                is_number = isinstance(value, int | float) and not isinstance(
+                    value, bool
+                )
+                complete = end < len(self.buffer) and (
+                    not is_number or self.buffer[end] in _DELIMITERS
+                )
+
+                if complete or self.exhausted:
+                    self.pos = end
+                    return value
+
+            # Read until the buffer doubles, so a value split over many
+            # chunks isn't reparsed once per chunk
+            target = 2 * (len(self.buffer) - self.pos)
+
+            while len(self.buffer) - self.pos < target and self._read_more():
+                pass
+
+
+def iter_array(chunks: Iterable[bytes], path: Sequence[str]) -> Iterator[Any]:
+    """
+    Yield the items of the array at `path` in a UTF-8 JSON document.
+
+    `path` are the keys of the nested objects leading to the array. Items are
+    yielded as soon as they have been read, and the rest of the document is
+    not read at all. Nothing is yielded if the path doesn't exist.
+    """
+    reader = _Reader(chunks)
+    depth = 0
+
+    reader.expect("{")
+
+    while reader.peek() != "}":
+        key = reader.value()
+        reader.expect(":")
+
+        if key != path[depth]:
+            reader.value()
+        elif depth < len(path) - 1:
+            depth += 1
+            reader.expect("{")
+            continue
+        else:
+            reader.expect("[")
+
+            while reader.peek() != "]":
+                yield reader.value()
+
+                if reader.peek() == ",":
+                    reader.pos += 1
+
+            return
+
+        if reader.peek() == ",":
+            reader.pos += 1
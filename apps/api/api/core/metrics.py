@@ -0,0 +1,50 @@
+from collections.abc import Callable, Iterable
+from typing import Literal, NamedTuple
+
+MetricType = Literal["counter", "gauge"]
+
+
+class Metric(NamedTuple):
+    name: str
+    type: MetricType
+    description: str
+    samples: list[tuple[dict[str, str], float]]
+
+
+MetricsCollector = Callable[[], Iterable[Metric]]
+
+_collectors: list[MetricsCollector] = []
+
+
+def register_collector(collector: MetricsCollector) -> MetricsCollector:
+    """Register a callable that is asked for its metrics on every scrape."""
+    _collectors.append(collector)
+    return collector
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+
+    escaped = (
+        f'{key}="{value.replace("\\", "\\\\").replace('"', '\\"')}"'
+        for key, value in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def render_metrics() -> str:
+    """Render all registered metrics in the Prometheus text exposition format."""
+    lines: list[str] = []
+
+    for collector in _collectors:
+        for metric in collector():
+            name = f"koru_{metric.name}"
+            lines.append(f"# HELP {name} {metric.description}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            lines.extend(
+                f"{name}{_format_labels(labels)} {value}"
+                for labels, value in metric.samples
+            )
+
+    return "\n".join(lines) + "\n"
@@ -1,6 +1,8 @@
+import time
 from functools import lru_cache
 
 import redis
+import redis.asyncio
 
 from api.core.config import settings
 from api.core.security import EXPIRY_TIMES
@@ -21,14 +23,42 @@ def get_redis_client() -> redis.Redis:
 redis_client = get_redis_client()
 
 
+@lru_cache
+def get_async_redis_client() -> redis.asyncio.Redis:
+    return redis.asyncio.Redis(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        db=settings.REDIS_DB,
+        password=settings.REDIS_PASSWORD or None,
+        decode_responses=True,
+    )
+
+
 def is_token_blacklisted(token_id: str) -> bool:
     key = f"{settings.REDIS_PREFIX}blacklist:{token_id}"
     return redis_client.exists(key) == 1
 
 
-def blacklist_token(token_id: str, expires_in: int) -> None:
+async def is_token_blacklisted_async(token_id: str) -> bool:
     key = f"{settings.REDIS_PREFIX}blacklist:{token_id}"
-    redis_client.set(key, "1", ex=expires_in)
+    return await get_async_redis_client().exists(key) == 1
+
+
+def blacklist_token(token_id: str, expires_in: int) -> bool:
+    """Returns False if the token was already blacklisted."""
+    key = f"{settings.REDIS_PREFIX}blacklist:{token_id}"
+    return bool(redis_client.set(key, str(time.time()), ex=expires_in, nx=True))
+
+
+def get_token_blacklist_time(token_id: str) -> float | None:
+    key = f"{settings.REDIS_PREFIX}blacklist:{token_id}"
+    value = redis_client.get(key)
+
+    if value is None:
+        return None
+
+    # Tokens blacklisted before the time was stored have "1" as the value
+    return float(value)
 
 
 def store_temp_user(user: User, jti: str, email: str) -> None:
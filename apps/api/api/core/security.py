@@ -1,11 +1,13 @@
+import time
 from datetime import UTC, datetime, timedelta
 from typing import Literal, NamedTuple
 
 import jwt  # PyJWT
 from nanoid import generate
 from passlib.context import CryptContext
-from pydantic import BaseModel, ValidationError
+from pydantic import BaseModel
 
+from api.core.cache import TTLCache
 from api.core.config import settings
 
 # ---- JWT ----
@@ -16,7 +18,8 @@ class TokenPayload(BaseModel):
     typ: str = "access"  # "access" or "refresh"
     exp: datetime
     iat: datetime
-    jti: str  # JWT ID, used for token revocation/blacklisting
+    jti: str  # JWT ID, used for refresh token reuse detection
+    sep: int = 0  # Session epoch of the user when the token was issued
 
 
 TOKEN_TYPES = (
@@ -41,6 +44,7 @@ def create_jwt_token(
     subject: str,
     token_type: TOKEN_TYPES,
     expires_delta: timedelta,
+    session_epoch: int = 0,
 ) -> JWTTokenResult:
     expire = datetime.now(UTC) + expires_delta
     jti = generate()
@@ -50,6 +54,7 @@ def create_jwt_token(
         exp=expire,
         iat=datetime.now(UTC),
         jti=jti,
+        sep=session_epoch,
     )
     encoded_jwt = jwt.encode(
         to_encode.model_dump(),
@@ -59,22 +64,62 @@ def create_jwt_token(
     return JWTTokenResult(token=encoded_jwt, jti=jti, expires_at=expire)
 
 
-def create_token(subject: str, token_type: TOKEN_TYPES) -> JWTTokenResult:
+def create_token(
+    subject: str, token_type: TOKEN_TYPES, session_epoch: int = 0
+) -> JWTTokenResult:
     expires_delta = timedelta(seconds=EXPIRY_TIMES[token_type])
     return create_jwt_token(
-        subject=subject, token_type=token_type, expires_delta=expires_delta
+        subject=subject,
+        token_type=token_type,
+        expires_delta=expires_delta,
+        session_epoch=session_epoch,
     )
 
 
+# Keyed by the token's signature, the whole token is compared on lookup
+_decoded_tokens: TTLCache[str, tuple[str, TokenPayload]] = TTLCache(
+    maxsize=settings.JWT_CACHE_SIZE, ttl=0
+)
+
+
 def decode_jwt(token: str) -> TokenPayload | None:
+    """
+    Verify and decode a token.
+
+    Decoded tokens are cached until they expire, so verifying the same token
+    again is a dictionary lookup.
+    """
+    signature = token.rpartition(".")[2]
+    cached = _decoded_tokens.get(signature)
+
+    if cached is not None and cached[0] == token:
+        return cached[1]
+
     try:
-        payload_dict = jwt.decode(
-            token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM]
+        claims = jwt.decode(
+            token,
+            settings.JWT_SECRET,
+            algorithms=[settings.JWT_ALGORITHM],
+            options={"require": ["sub", "exp", "iat", "jti"]},
+        )
+        # PyJWT already checked the registered claims, skip the validation
+        payload = TokenPayload.model_construct(
+            sub=str(claims["sub"]),
+            typ=str(claims.get("typ", "access")),
+            exp=datetime.fromtimestamp(claims["exp"], UTC),
+            iat=datetime.fromtimestamp(claims["iat"], UTC),
+            jti=str(claims["jti"]),
+            sep=int(claims.get("sep", 0)),
         )
-        return TokenPayload(**payload_dict)
-    except (jwt.PyJWTError, ValidationError):
+    except (jwt.PyJWTError, TypeError, ValueError):
         return None
 
+    _decoded_tokens.set(
+        signature, (token, payload), ttl=payload.exp.timestamp() - time.time()
+    )
+
+    return payload
+
 
 # ---- Password ----
 
@@ -1,12 +1,101 @@
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
 
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlmodel import Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from api.core.config import settings
+from api.db.pool import engine_options, register_engine, supports_async
+from api.db.replica import ReplicaMonitor, register_replica
 
-engine = create_engine(settings.DATABASE_URL)
+engine = create_engine(
+    settings.DATABASE_URL, **engine_options("primary", settings.DATABASE_URL)
+)
+
+register_engine("primary", engine)
+
+# Web requests get a statement timeout, the engine above is shared with Celery
+# tasks and migrations, whose long statements must not be cancelled. Connections
+# are only opened on first use, so processes not serving requests open none
+request_engine = create_engine(
+    settings.DATABASE_URL,
+    **engine_options(
+        "primary_request",
+        settings.DATABASE_URL,
+        statement_timeout=settings.DATABASE_STATEMENT_TIMEOUT,
+    ),
+)
+
+register_engine("primary_request", request_engine)
+
+async_engine: AsyncEngine | None = None
+
+# psycopg 3 provides both a sync and an async driver under the same URL scheme,
+# other drivers (e.g. SQLite's) only serve the sync endpoints
+if supports_async(settings.DATABASE_URL):
+    async_engine = create_async_engine(
+        settings.DATABASE_URL,
+        **engine_options(
+            "primary_async",
+            settings.DATABASE_URL,
+            is_async=True,
+            statement_timeout=settings.DATABASE_STATEMENT_TIMEOUT,
+        ),
+    )
+
+    register_engine("primary_async", async_engine.sync_engine)
+
+read_engine = None
+replica_monitor = None
+
+if settings.DATABASE_READ_URL:
+    read_engine = create_engine(
+        settings.DATABASE_READ_URL,
+        **engine_options(
+            "replica",
+            settings.DATABASE_READ_URL,
+            statement_timeout=settings.DATABASE_STATEMENT_TIMEOUT,
+        ),
+    )
+    replica_monitor = ReplicaMonitor(
+        read_engine,
+        max_lag=settings.DATABASE_READ_MAX_LAG,
+        check_interval=settings.DATABASE_READ_LAG_CHECK_INTERVAL,
+    )
+
+    register_engine("replica", read_engine)
+    register_replica("replica", replica_monitor)
+
+# Objects are used after the request's commit (e.g. to issue tokens), and
+# expired attributes can't be lazily refreshed outside of an awaited call
+async_session_maker = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
 
 
 def get_db() -> Generator[Session, None, None]:
-    with Session(engine) as session:
+    with Session(request_engine) as session:
+        yield session
+
+
+def get_read_db() -> Generator[Session, None, None]:
+    """Session for read-only endpoints, served by the replica when it is healthy."""
+    bind = request_engine
+
+    if read_engine is not None and replica_monitor and replica_monitor.is_usable():
+        bind = read_engine
+
+    with Session(bind) as session:
+        yield session
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    if async_engine is None:
+        raise RuntimeError(
+            "DATABASE_URL has no async driver, use postgresql+psycopg://"
+        )
+
+    async with async_session_maker() as session:
         yield session
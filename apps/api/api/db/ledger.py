@@ -0,0 +1,272 @@
+from collections import defaultdict
+from collections.abc import Iterable, Sequence
+from datetime import date, datetime
+from typing import Any, cast
+
+from sqlalchemy import (
+    CursorResult,
+    DateTime,
+    Float,
+    Row,
+    case,
+    delete,
+    func,
+    literal_column,
+    select,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql.elements import ColumnElement
+from sqlmodel import Session, col
+
+from api.models.account import Account
+from api.models.account_daily_summary import AccountDailySummary
+from api.models.transaction import Transaction
+
+
+def previous_value(
+    table: str, column: str, type_: Any, label: str
+) -> ColumnElement[Any]:
+    """
+    Value of `column` before the current upsert, for use in its RETURNING clause.
+
+    Subqueries see the snapshot taken when the statement started, so this is
+    NULL for inserted rows and the old value for updated ones.
+    """
+    return literal_column(
+        f'(SELECT previous."{column}" FROM "{table}" AS previous '
+        f'WHERE previous.id = "{table}".id)',
+        type_=type_,
+    ).label(label)
+
+
+# Columns to request from a transaction upsert to compute the ledger deltas
+transaction_ledger_returning = [
+    col(Transaction.account_id),
+    col(Transaction.user_id),
+    col(Transaction.booking_time),
+    col(Transaction.amount),
+    col(Transaction.native_amount),
+    previous_value("transaction", "booking_time", DateTime(), "previous_booking_time"),
+    previous_value("transaction", "amount", Float(), "previous_amount"),
+    previous_value("transaction", "native_amount", Float(), "previous_native_amount"),
+]
+
+summary_columns = [
+    "income",
+    "expense",
+    "native_income",
+    "native_expense",
+    "transaction_count",
+]
+
+
+def apply_ledger_deltas(session: Session, rows: Sequence[Row[Any]]) -> None:
+    """
+    Update the balances and daily summaries from a transaction upsert's rows.
+
+    Must run in the same database transaction as the upsert.
+    """
+    lock_accounts(session, {row.account_id for row in rows})
+    apply_balance_deltas(session, rows)
+    apply_daily_summary_deltas(session, rows)
+
+
+def lock_accounts(session: Session, account_ids: Iterable[str]) -> None:
+    """
+    Lock the account rows until the end of the database transaction.
+
+    Taken before writing summary deltas, even when the balances don't change,
+    so they can't interleave with `rebuild_daily_summaries`. Locked in id
+    order, so concurrent imports of the same accounts can't deadlock.
+    """
+    account_ids = sorted(account_ids)
+
+    if not account_ids:
+        return
+
+    session.execute(
+        select(col(Account.id))
+        .where(col(Account.id).in_(account_ids))
+        .order_by(col(Account.id))
+        .with_for_update()
+    )
+
+
+def apply_balance_deltas(session: Session, rows: Sequence[Row[Any]]) -> None:
+    """
+    Update the stored balances from the rows returned by a transaction upsert.
+
+    Must run in the same database transaction as the upsert.
+    """
+    deltas: dict[str, float] = defaultdict(float)
+
+    for row in rows:
+        deltas[row.account_id] += row.native_amount - (
+            row.previous_native_amount or 0.0
+        )
+
+    for account_id, delta in deltas.items():
+        if not delta:
+            continue
+
+        session.execute(
+            update(Account)
+            .where(col(Account.id) == account_id)
+            .values(transaction_balance=Account.transaction_balance + delta)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def _add_to_summary(
+    totals: list[float], amount: float, native_amount: float, sign: int
+) -> None:
+    totals[0] += sign * max(amount, 0.0)
+    totals[1] += sign * max(-amount, 0.0)
+    totals[2] += sign * max(native_amount, 0.0)
+    totals[3] += sign * max(-native_amount, 0.0)
+    totals[4] += sign
+
+
+def apply_daily_summary_deltas(session: Session, rows: Sequence[Row[Any]]) -> None:
+    """
+    Update the daily summaries from the rows returned by a transaction upsert.
+
+    Must run in the same database transaction as the upsert.
+    """
+    deltas: dict[tuple[str, date], list[float]] = defaultdict(lambda: [0.0] * 5)
+    user_ids: dict[str, str] = {}
+
+    for row in rows:
+        user_ids[row.account_id] = row.user_id
+        booking_time: datetime = row.booking_time
+        _add_to_summary(
+            deltas[row.account_id, booking_time.date()],
+            row.amount,
+            row.native_amount,
+            1,
+        )
+
+        # Updated rows also take back what they contributed before
+        previous_booking_time: datetime | None = row.previous_booking_time
+        if previous_booking_time is not None:
+            _add_to_summary(
+                deltas[row.account_id, previous_booking_time.date()],
+                row.previous_amount,
+                row.previous_native_amount,
+                -1,
+            )
+
+    values = [
+        {
+            "account_id": account_id,
+            "day": day,
+            "user_id": user_ids[account_id],
+            "income": income,
+            "expense": expense,
+            "native_income": native_income,
+            "native_expense": native_expense,
+            "transaction_count": int(count),
+        }
+        for (account_id, day), totals in deltas.items()
+        if any(totals)
+        for income, expense, native_income, native_expense, count in [totals]
+    ]
+
+    if not values:
+        return
+
+    insert_stmt = insert(AccountDailySummary).values(values)
+    session.execute(
+        insert_stmt.on_conflict_do_update(
+            index_elements=["account_id", "day"],
+            set_={
+                column: getattr(AccountDailySummary, column)
+                + getattr(insert_stmt.excluded, column)
+                for column in summary_columns
+            },
+        )
+    )
+
+
+def rebuild_balances(session: Session, account_id: str | None = None) -> int:
+    """
+    Recompute the stored balances from the transactions.
+
+    Returns the number of accounts that were rebuilt.
+    """
+    total = (
+        select(func.coalesce(func.sum(Transaction.native_amount), 0.0))
+        .where(col(Transaction.account_id) == Account.id)
+        .scalar_subquery()
+    )
+
+    statement = update(Account).values(transaction_balance=total)
+
+    # The sums are read from the snapshot the update starts with, so the rows
+    # are locked first. An import committing while the update waited for its
+    # lock would otherwise be left out, and its delta overwritten
+    lock_query = select(col(Account.id)).order_by(col(Account.id)).with_for_update()
+
+    if account_id is not None:
+        statement = statement.where(col(Account.id) == account_id)
+        lock_query = lock_query.where(col(Account.id) == account_id)
+
+    session.execute(lock_query)
+    result = cast(
+        CursorResult[Any],
+        session.execute(statement.execution_options(synchronize_session=False)),
+    )
+    return result.rowcount
+
+
+def rebuild_daily_summaries(session: Session, account_id: str | None = None) -> int:
+    """
+    Recompute the daily summaries from the transactions.
+
+    Returns the number of summary rows that were written.
+    """
+    delete_stmt = delete(AccountDailySummary)
+    totals_query = select(
+        col(Transaction.account_id),
+        func.date(Transaction.booking_time).label("day"),
+        col(Transaction.user_id),
+        func.sum(case((col(Transaction.amount) > 0, Transaction.amount), else_=0.0)),
+        func.sum(case((col(Transaction.amount) < 0, -Transaction.amount), else_=0.0)),
+        func.sum(
+            case(
+                (col(Transaction.native_amount) > 0, Transaction.native_amount),
+                else_=0.0,
+            )
+        ),
+        func.sum(
+            case(
+                (col(Transaction.native_amount) < 0, -Transaction.native_amount),
+                else_=0.0,
+            )
+        ),
+        func.count(),
+    ).group_by(col(Transaction.account_id), "day", col(Transaction.user_id))
+
+    # Imports lock the account rows before their summaries, so locking them
+    # here keeps imports from writing deltas in between the delete and insert
+    lock_query = select(col(Account.id)).order_by(col(Account.id)).with_for_update()
+
+    if account_id is not None:
+        delete_stmt = delete_stmt.where(
+            col(AccountDailySummary.account_id) == account_id
+        )
+        totals_query = totals_query.where(col(Transaction.account_id) == account_id)
+        lock_query = lock_query.where(col(Account.id) == account_id)
+
+    session.execute(lock_query)
+    session.execute(delete_stmt.execution_options(synchronize_session=False))
+    result = cast(
+        CursorResult[Any],
+        session.execute(
+            insert(AccountDailySummary).from_select(
+                ["account_id", "day", "user_id", *summary_columns], totals_query
+            )
+        ),
+    )
+    return result.rowcount
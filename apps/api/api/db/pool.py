@@ -0,0 +1,170 @@
+import threading
+import time
+from collections.abc import Iterable
+from typing import Any
+
+from sqlalchemy import Engine, exc, make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry, Pool, QueuePool
+
+from api.core.config import settings
+from api.core.metrics import Metric, register_collector
+
+
+class PoolWaitStats:
+    """Time spent by callers waiting for a connection to be handed out."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.timeouts = 0
+
+    def observe(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            self.count += 1
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+
+# Keyed by pool name, so the stats survive the pool being recreated on dispose()
+_wait_stats: dict[str, PoolWaitStats] = {}
+_engines: dict[str, Engine] = {}
+
+
+def get_wait_stats(name: str) -> PoolWaitStats:
+    return _wait_stats.setdefault(name, PoolWaitStats())
+
+
+class _WaitTimingMixin(Pool):
+    def _do_get(self) -> ConnectionPoolEntry:
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            get_wait_stats(self.logging_name or "default").observe(
+                time.perf_counter() - start, timed_out
+            )
+
+
+class InstrumentedQueuePool(_WaitTimingMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_WaitTimingMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(
+    name: str, url: str, is_async: bool = False, statement_timeout: int = 0
+) -> dict[str, Any]:
+    """
+    Keyword arguments for `create_engine` based on the pool settings.
+
+    `statement_timeout` is in milliseconds, Postgres cancels statements running
+    longer than that (0 disables it).
+    """
+    options: dict[str, Any] = {
+        "poolclass": InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        "pool_logging_name": name,
+        "pool_size": settings.DATABASE_POOL_SIZE,
+        "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+        "pool_timeout": settings.DATABASE_POOL_TIMEOUT,
+        "pool_recycle": settings.DATABASE_POOL_RECYCLE,
+        "pool_pre_ping": settings.DATABASE_POOL_PRE_PING,
+    }
+
+    if make_url(url).get_backend_name() == "postgresql":
+        connect_args: dict[str, Any] = {
+            "prepare_threshold": settings.DATABASE_PREPARE_THRESHOLD
+        }
+
+        if statement_timeout:
+            connect_args["options"] = f"-c statement_timeout={statement_timeout}"
+
+        options["connect_args"] = connect_args
+
+    return options
+
+
+def supports_async(url: str) -> bool:
+    """Whether `url` names a driver that `create_async_engine` can use."""
+    parsed = make_url(url)
+    return parsed.get_dialect().get_async_dialect_cls(parsed).is_async
+
+
+def register_engine(name: str, engine: Engine) -> None:
+    """Expose the pool of `engine` (use `.sync_engine` for async ones) as metrics."""
+    _engines[name] = engine
+
+
+@register_collector
+def collect_pool_metrics() -> Iterable[Metric]:
+    checked_out: list[tuple[dict[str, str], float]] = []
+    checked_in: list[tuple[dict[str, str], float]] = []
+    overflow: list[tuple[dict[str, str], float]] = []
+    size: list[tuple[dict[str, str], float]] = []
+
+    for name, engine in _engines.items():
+        # Read through the engine, dispose() swaps the pool for a new one
+        pool = engine.pool
+        if not isinstance(pool, QueuePool):
+            continue
+
+        labels = {"pool": name}
+        checked_out.append((labels, pool.checkedout()))
+        checked_in.append((labels, pool.checkedin()))
+        overflow.append((labels, max(pool.overflow(), 0)))
+        size.append((labels, pool.size()))
+
+    yield Metric(
+        "db_pool_checked_out",
+        "gauge",
+        "Connections currently in use",
+        checked_out,
+    )
+    yield Metric(
+        "db_pool_checked_in",
+        "gauge",
+        "Idle connections held by the pool",
+        checked_in,
+    )
+    yield Metric(
+        "db_pool_overflow",
+        "gauge",
+        "Connections open beyond the configured pool size",
+        overflow,
+    )
+    yield Metric("db_pool_size", "gauge", "Configured pool size", size)
+
+    wait_stats = list(_wait_stats.items())
+    yield Metric(
+        "db_pool_wait_seconds_total",
+        "counter",
+        "Total time spent waiting for a connection",
+        [({"pool": name}, stats.total_seconds) for name, stats in wait_stats],
+    )
+    yield Metric(
+        "db_pool_wait_count_total",
+        "counter",
+        "Number of connection checkouts",
+        [({"pool": name}, stats.count) for name, stats in wait_stats],
+    )
+    yield Metric(
+        "db_pool_wait_max_seconds",
+        "gauge",
+        "Longest wait for a connection since the process started",
+        [({"pool": name}, stats.max_seconds) for name, stats in wait_stats],
+    )
+    yield Metric(
+        "db_pool_timeouts_total",
+        "counter",
+        "Checkouts that gave up after the pool timeout",
+        [({"pool": name}, stats.timeouts) for name, stats in wait_stats],
+    )
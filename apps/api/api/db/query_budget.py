@@ -0,0 +1,77 @@
+import logging
+from collections.abc import Callable, Generator
+from types import TracebackType
+from typing import Annotated
+
+from fastapi import Depends, Request
+from sqlalchemy import event
+from sqlalchemy.orm import ORMExecuteState
+from sqlmodel import Session
+
+from api.core.config import settings
+from api.core.exceptions import QueryBudgetExceededError
+from api.db.database import get_read_db
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCounter:
+    """
+    Counts the statements a session executes, including relationship loads.
+
+    Use as a context manager around the code being measured.
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+        self.count = 0
+
+    def _on_execute(self, _: ORMExecuteState) -> None:
+        self.count += 1
+
+    def __enter__(self) -> "QueryCounter":
+        event.listen(self.session, "do_orm_execute", self._on_execute)
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        event.remove(self.session, "do_orm_execute", self._on_execute)
+
+
+def query_budget(
+    max_queries: int,
+    get_session: Callable[..., Generator[Session, None, None]] = get_read_db,
+) -> Callable[..., Generator[Session, None, None]]:
+    """
+    Session dependency that checks the endpoint stays within `max_queries`.
+
+    Exceeding the budget is logged, or raised with `QUERY_BUDGET_STRICT`.
+    """
+
+    def dependency(
+        request: Request,
+        session: Annotated[Session, Depends(get_session)],
+    ) -> Generator[Session, None, None]:
+        with QueryCounter(session) as counter:
+            yield session
+
+        if counter.count <= max_queries:
+            return
+
+        error = QueryBudgetExceededError(
+            f"{request.method} {request.url.path}", max_queries, counter.count
+        )
+
+        if settings.QUERY_BUDGET_STRICT:
+            raise error
+
+        logger.warning(error.message)
+
+    # Lets tests find the budgeted endpoints
+    dependency.max_queries = max_queries  # type: ignore[attr-defined]
+
+    return dependency
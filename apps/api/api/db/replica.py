@@ -0,0 +1,93 @@
+import logging
+import threading
+import time
+from collections.abc import Iterable
+
+from sqlalchemy import Engine, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from api.core.metrics import Metric, register_collector
+
+logger = logging.getLogger(__name__)
+
+# A replica that has replayed everything it received is not lagging, even if
+# the primary has been idle and the last replayed transaction is old
+REPLICA_LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+    """
+)
+
+
+class ReplicaMonitor:
+    """Periodically measures replication lag to decide if the replica is usable."""
+
+    def __init__(self, engine: Engine, max_lag: float, check_interval: float):
+        self.engine = engine
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+
+        self.lag: float | None = None
+        self.usable = False
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def is_usable(self) -> bool:
+        if time.monotonic() < self._next_check:
+            return self.usable
+
+        # Only one thread measures, the others keep using the last result
+        if not self._lock.acquire(blocking=False):
+            return self.usable
+
+        try:
+            self.lag = self._measure_lag()
+            self.usable = self.lag is not None and self.lag <= self.max_lag
+            self._next_check = time.monotonic() + self.check_interval
+        finally:
+            self._lock.release()
+
+        return self.usable
+
+    def _measure_lag(self) -> float | None:
+        try:
+            with self.engine.connect() as connection:
+                lag = connection.execute(REPLICA_LAG_QUERY).scalar()
+        except SQLAlchemyError:
+            logger.warning("Read replica is unreachable, using primary", exc_info=True)
+            return None
+
+        return float(lag) if lag is not None else None
+
+
+_monitors: dict[str, ReplicaMonitor] = {}
+
+
+def register_replica(name: str, monitor: ReplicaMonitor) -> None:
+    _monitors[name] = monitor
+
+
+@register_collector
+def collect_replica_metrics() -> Iterable[Metric]:
+    monitors = list(_monitors.items())
+
+    yield Metric(
+        "db_replica_usable",
+        "gauge",
+        "Whether reads are currently routed to the replica",
+        [({"pool": name}, float(monitor.usable)) for name, monitor in monitors],
+    )
+    yield Metric(
+        "db_replica_lag_seconds",
+        "gauge",
+        "Last measured replication lag",
+        [
+            ({"pool": name}, monitor.lag)
+            for name, monitor in monitors
+            if monitor.lag is not None
+        ],
+    )
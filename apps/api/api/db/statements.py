@@ -0,0 +1,65 @@
+"""
+Cached statements for the hottest queries.
+
+`lambda_stmt` caches the constructed statement by the lambda's code location,
+so only the bound values are extracted on later calls, instead of rebuilding
+the query and computing its cache key on every request.
+
+Execute these with `session.scalars(...)`, SQLModel's `exec` only unwraps
+scalars for plain `select` statements.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import StatementLambdaElement, lambda_stmt
+from sqlalchemy.orm import selectinload
+from sqlmodel import col, select, tuple_
+
+from api.models.account import Account
+from api.models.transaction import Transaction
+from api.models.user import User
+
+
+def user_by_id(user_id: str) -> StatementLambdaElement:
+    return lambda_stmt(lambda: select(User).where(col(User.id) == user_id))
+
+
+def accounts_by_user(user_id: str) -> StatementLambdaElement:
+    return lambda_stmt(lambda: select(Account).where(col(Account.user_id) == user_id))
+
+
+def transaction_page(
+    user_id: str,
+    limit: int,
+    cursor: tuple[datetime, str] | None = None,
+    offset: int = 0,
+) -> StatementLambdaElement:
+    """A page of the user's transactions, newest first, after `cursor` if given."""
+    statement = lambda_stmt(
+        lambda: (
+            select(Transaction)
+            .where(col(Transaction.user_id) == user_id)
+            .options(
+                selectinload(Transaction.account),  # type: ignore[arg-type]
+                selectinload(Transaction.opposing_merchant),  # type: ignore[arg-type]
+                selectinload(Transaction.opposing_counterparty),  # type: ignore[arg-type]
+                selectinload(Transaction.opposing_account),  # type: ignore[arg-type]
+            )
+            # The ID breaks ties, so pages don't skip or repeat transactions
+            .order_by(col(Transaction.booking_time).desc(), col(Transaction.id).desc())
+        )
+    )
+
+    # Each combination of the criteria below is cached separately
+    if cursor is not None:
+        booking_time, transaction_id = cursor
+        statement += lambda s: s.where(
+            tuple_(Transaction.booking_time, Transaction.id)
+            < tuple_(booking_time, transaction_id)
+        )
+    elif offset:
+        statement += lambda s: s.offset(offset)
+
+    statement += lambda s: s.limit(limit)
+
+    return statement
@@ -0,0 +1,67 @@
+from collections.abc import Iterable
+from datetime import date, timedelta
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, col
+
+from api.core.config import settings
+from api.models.account import Account
+from api.models.account_sync_state import AccountSyncState
+
+
+def get_sync_start_dates(
+    session: Session, internal_ids: Iterable[str]
+) -> dict[str, date]:
+    """
+    The date to fetch transactions from for each already imported account.
+
+    It's the newest booking date seen minus `GOCARDLESS_SYNC_OVERLAP_DAYS`, as
+    banks book some transactions late and pending ones can still change.
+    Accounts that were never imported are missing, their full history is
+    fetched.
+    """
+    overlap = timedelta(days=settings.GOCARDLESS_SYNC_OVERLAP_DAYS)
+    rows = session.execute(
+        select(col(Account.internal_id), col(AccountSyncState.last_booking_date))
+        .join(AccountSyncState, col(AccountSyncState.account_id) == Account.id)
+        .where(
+            col(Account.internal_id).in_(list(internal_ids)),
+            col(AccountSyncState.last_booking_date).isnot(None),
+        )
+    )
+
+    return {
+        internal_id: last_booking_date - overlap
+        for internal_id, last_booking_date in rows
+        if internal_id is not None and last_booking_date is not None
+    }
+
+
+def record_sync(
+    session: Session, account_id: str, last_booking_date: date | None
+) -> None:
+    """
+    Record a successful import of an account, without committing.
+
+    `last_booking_date` is the newest booking date of the imported
+    transactions, the watermark never moves back.
+    """
+    stmt = insert(AccountSyncState).values(
+        account_id=account_id,
+        last_synced_at=func.now(),
+        last_booking_date=last_booking_date,
+    )
+    session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[AccountSyncState.account_id],
+            set_={
+                "last_synced_at": stmt.excluded.last_synced_at,
+                # greatest() ignores NULLs, e.g. an import without transactions
+                "last_booking_date": func.greatest(
+                    AccountSyncState.last_booking_date,
+                    stmt.excluded.last_booking_date,
+                ),
+            },
+        )
+    )
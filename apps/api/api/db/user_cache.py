@@ -0,0 +1,126 @@
+"""
+Two-level cache of the authenticated user.
+
+Users are cached in-process for a few seconds and in Redis for longer. The
+Redis copy is tagged with the user's version, a counter that is incremented
+whenever a session commits a change to the user row, so stale copies are
+never served. Other processes see a change once their in-process entry expires.
+
+Cached users have a blank `password_hash`, credentials are never copied to
+Redis. Code that checks passwords loads the user from the database.
+
+Bulk UPDATE/DELETE statements bypass the session tracking and must call
+`invalidate_user` themselves.
+"""
+
+import json
+from itertools import chain
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from api.core.cache import TTLCache
+from api.core.config import settings
+from api.core.redis import get_async_redis_client, redis_client
+from api.db.statements import user_by_id
+from api.models.user import User
+
+_CHANGED_USERS_KEY = "changed_user_ids"
+
+_local_cache: TTLCache[str, User] = TTLCache(
+    maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_LOCAL_TTL
+)
+
+
+def _version_key(user_id: str) -> str:
+    return f"{settings.REDIS_PREFIX}user:{user_id}:version"
+
+
+def _copy_key(user_id: str) -> str:
+    return f"{settings.REDIS_PREFIX}user:{user_id}"
+
+
+def _from_cached(data: dict[str, Any]) -> User:
+    return User.model_validate({**data, "password_hash": ""})
+
+
+async def get_cached_user(db: AsyncSession, user_id: str) -> User | None:
+    """
+    Get a user from the cache, loading it with `db` on a miss.
+
+    Returns a detached instance shared between requests, don't modify it. Its
+    `password_hash` is blank.
+    """
+    user = _local_cache.get(user_id)
+
+    if user is not None:
+        return user
+
+    # The version is read before the database, so a change committed in
+    # between makes the copy stored below stale instead of current
+    version_value, copy_value = await get_async_redis_client().mget(
+        _version_key(user_id), _copy_key(user_id)
+    )
+    version = int(version_value or 0)
+
+    if copy_value is not None:
+        copy = json.loads(copy_value)
+
+        if copy["version"] == version:
+            user = _from_cached(copy["user"])
+            _local_cache.set(user_id, user)
+            return user
+
+    result = await db.scalars(user_by_id(user_id))
+    db_user: User | None = result.one_or_none()
+
+    if db_user is None:
+        return None
+
+    cached = db_user.model_dump(mode="json", exclude={"password_hash"})
+    user = _from_cached(cached)
+
+    await get_async_redis_client().set(
+        _copy_key(user_id),
+        json.dumps({"version": version, "user": cached}),
+        ex=settings.USER_CACHE_TTL,
+    )
+    _local_cache.set(user_id, user)
+
+    return user
+
+
+def invalidate_user(user_id: str) -> None:
+    """Drop the cached copies of a user, sync as it runs in session events."""
+    _local_cache.delete(user_id)
+
+    # The version never expires, so it can't go back to a value that a copy
+    # written after the increment, by a request that read it before, is
+    # tagged with. It's one small key per changed user.
+    pipeline = redis_client.pipeline()
+    pipeline.incr(_version_key(user_id))
+    pipeline.delete(_copy_key(user_id))
+    pipeline.execute()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session: Session, flush_context: Any) -> None:
+    changed_user_ids = session.info.setdefault(_CHANGED_USERS_KEY, set())
+
+    for instance in chain(session.dirty, session.deleted):
+        if isinstance(instance, User):
+            changed_user_ids.add(instance.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session: Session) -> None:
+    # Invalidated after the commit, so a miss can't reload the old row
+    for user_id in session.info.pop(_CHANGED_USERS_KEY, ()):
+        invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_users(session: Session) -> None:
+    session.info.pop(_CHANGED_USERS_KEY, None)
@@ -1,9 +1,25 @@
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from itertools import batched
 from typing import Any
 
-from sqlalchemy import tuple_
-from sqlalchemy.dialects.postgresql import insert
+from nanoid import generate
+from sqlalchemy import Row, column, select, table, tuple_
+from sqlalchemy.dialects.postgresql import Insert, insert
 from sqlmodel import Session
 
+# Postgres limits a statement to 65535 bind parameters, keep some headroom for
+# the parameters of the conflict clause
+MAX_BIND_PARAMETERS = 65_535 - 1_000
+
+# From this many rows on, values are streamed with COPY into a staging table
+# instead of being compiled into INSERT statements. Callers upserting in batches
+# should make them at least this large, e.g. GOCARDLESS_UPSERT_BATCH_SIZE.
+COPY_UPSERT_THRESHOLD = 5_000
+
+# Staging table names are lowercase, nanoid's default alphabet isn't
+_STAGING_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyz"
+
 
 def upsert_db(
     values: list[Any],
@@ -12,12 +28,62 @@ def upsert_db(
     update_whitelist: list[str],
     index_elements: list[Any],
     update_override: dict[str, Any] | None = None,
-) -> None:
+    returning: list[Any] | None = None,
+    commit: bool = True,
+) -> Sequence[Row[Any]]:
+    """
+    Insert `values`, updating conflicting rows whose whitelisted columns changed.
+
+    The inserted and updated rows are returned with the `returning` columns.
+    Pass `commit=False` to make further changes in the same transaction.
+
+    Large batches go through COPY, smaller ones are split into multi-row
+    inserts that stay below the bind parameter limit.
+    """
     if update_override is None:
         update_override = {}
 
-    insert_stmt = insert(model).values(values)
+    if not values:
+        if commit:
+            session.commit()
+        return []
+
+    def upsert(insert_stmt: Insert) -> Sequence[Row[Any]]:
+        return _execute_upsert(
+            insert_stmt,
+            session,
+            model,
+            update_whitelist,
+            index_elements,
+            update_override,
+            returning,
+        )
+
+    rows: list[Row[Any]] = []
 
+    if len(values) >= COPY_UPSERT_THRESHOLD:
+        with _staging_table(values, session, model) as insert_stmt:
+            rows.extend(upsert(insert_stmt))
+    else:
+        chunk_size = max(MAX_BIND_PARAMETERS // len(values[0]), 1)
+        for chunk in batched(values, chunk_size):
+            rows.extend(upsert(insert(model).values(list(chunk))))
+
+    if commit:
+        session.commit()
+
+    return rows
+
+
+def _execute_upsert(
+    insert_stmt: Insert,
+    session: Session,
+    model: Any,
+    update_whitelist: list[str],
+    index_elements: list[Any],
+    update_override: dict[str, Any],
+    returning: list[Any] | None,
+) -> Sequence[Row[Any]]:
     update_columns = {
         **{col: getattr(insert_stmt.excluded, col) for col in update_whitelist},
         **update_override,
@@ -34,5 +100,48 @@ def upsert_db(
         where=where_tuple_existing.is_distinct_from(where_tuple_new),
     )
 
+    if returning:
+        return session.execute(insert_stmt.returning(*returning)).all()
+
     session.execute(insert_stmt)
-    session.commit()
+    return []
+
+
+@contextmanager
+def _staging_table(values: list[Any], session: Session, model: Any) -> Iterator[Insert]:
+    """
+    COPY `values` into a temporary table shaped like `model`'s table.
+
+    Yields an INSERT ... SELECT from the staging table, which is dropped on exit.
+    Should the upsert fail, rolling back the transaction drops it instead. Its
+    name is unique, so a table left behind never blocks the next upsert.
+    """
+    target_name = model.__table__.name
+    staging_name = f"_upsert_{target_name}_{generate(_STAGING_ALPHABET, 12)}"
+    columns = list(values[0].keys())
+
+    connection = session.connection()
+    quote = connection.dialect.identifier_preparer.quote
+    column_list = ", ".join(quote(name) for name in columns)
+
+    connection.exec_driver_sql(
+        f"CREATE TEMPORARY TABLE {quote(staging_name)} "
+        f"(LIKE {quote(target_name)} INCLUDING DEFAULTS) ON COMMIT DROP"
+    )
+
+    driver_connection = connection.connection.driver_connection
+    assert driver_connection is not None
+
+    with (
+        driver_connection.cursor() as cursor,
+        cursor.copy(f"COPY {quote(staging_name)} ({column_list}) FROM STDIN") as copy,
+    ):
+        for value in values:
+            copy.write_row([value[name] for name in columns])
+
+    staging_table = table(staging_name, *[column(name) for name in columns])
+    yield insert(model).from_select(
+        columns, select(*[staging_table.c[name] for name in columns])
+    )
+
+    connection.exec_driver_sql(f"DROP TABLE {quote(staging_name)}")
@@ -1,19 +1,19 @@
 from typing import Annotated
 
-import requests
 from fastapi import Cookie, Depends, Header, HTTPException, status
-from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from api.core.config import settings
-from api.core.redis import is_token_blacklisted
+from api.core.captcha import CaptchaVerifier, get_captcha_verifier
+from api.core.redis import is_token_blacklisted_async
 from api.core.security import decode_jwt
-from api.db.database import get_db
+from api.db.database import get_async_db
+from api.db.user_cache import get_cached_user
 from api.models.user import User
 
 
 async def get_user(
     access_token: Annotated[str, Cookie()],
-    db: Annotated[Session, Depends(get_db)],
+    db: Annotated[AsyncSession, Depends(get_async_db)],
 ) -> User:
     payload = decode_jwt(access_token)
 
@@ -31,34 +31,33 @@ async def get_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    if is_token_blacklisted(payload.jti):
+    user = await get_cached_user(db, payload.sub)
+
+    if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token has been revoked",
-            headers={"WWW-Authenticate": "Bearer"},
+            detail="User not found",
         )
 
-    user = db.exec(select(User).where(User.id == payload.sub)).one_or_none()
-
-    if user is None:
+    # Logging out of a single device blacklists its access token, the epoch
+    # only revokes all of them
+    if payload.sep != user.session_epoch or await is_token_blacklisted_async(
+        payload.jti
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
         )
 
     return user
 
 
-def verify_hcaptcha(hcaptcha_token: Annotated[str, Header()]) -> bool:
-    response = requests.post(
-        "https://hcaptcha.com/siteverify",
-        data={
-            "secret": settings.HCAPTCHA_SECRET,
-            "response": hcaptcha_token,
-        },
-    )
-
-    if not response.json()["success"]:
+async def verify_hcaptcha(
+    hcaptcha_token: Annotated[str, Header()],
+    verifier: Annotated[CaptchaVerifier, Depends(get_captcha_verifier)],
+) -> bool:
+    if not await verifier.verify(hcaptcha_token):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid hCaptcha token",
@@ -1,11 +1,29 @@
-from fastapi import FastAPI, status
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse
 from fastapi.routing import APIRoute
 
+from api.core.captcha import get_captcha_verifier
 from api.core.config import settings
+from api.core.exceptions import CaptchaUnavailableError, PasswordHasherBusyError
+from api.core.gocardless import warm_institutions
+from api.core.institution_search import get_institution_index
 from api.schemas.base import ErrorResponse, MessageResponse
 
 from .middleware.cloudflare_ip import CloudflareMiddleware
-from .routers import account, auth, connection, import_router, transaction, waitlist
+from .middleware.rate_limit import RateLimitMiddleware
+from .routers import (
+    account,
+    auth,
+    connection,
+    import_router,
+    institution,
+    metrics,
+    transaction,
+    waitlist,
+)
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
@@ -16,7 +34,16 @@ def custom_generate_unique_id(route: APIRoute) -> str:
     return name_parts[0] + "".join(part.capitalize() for part in name_parts[1:])
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # The search index is rebuilt along with the institutions, off the requests
+    warm_institutions(on_loaded=get_institution_index)
+    yield
+    await get_captcha_verifier().aclose()
+
+
 app = FastAPI(
+    lifespan=lifespan,
     generate_unique_id_function=custom_generate_unique_id,
     root_path="/api",
     responses={
@@ -27,14 +54,43 @@ app = FastAPI(
     },
 )
 
+# Added first so it runs inside CloudflareMiddleware and sees the real client IP
+app.add_middleware(RateLimitMiddleware)
 app.add_middleware(CloudflareMiddleware)
 
+
+@app.exception_handler(PasswordHasherBusyError)
+async def password_hasher_busy_handler(
+    request: Request, exc: PasswordHasherBusyError
+) -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content=ErrorResponse(detail="Server is busy, try again").model_dump(),
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(CaptchaUnavailableError)
+async def captcha_unavailable_handler(
+    request: Request, exc: CaptchaUnavailableError
+) -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content=ErrorResponse(
+            detail="Captcha verification is unavailable"
+        ).model_dump(),
+        headers={"Retry-After": str(int(settings.HCAPTCHA_BREAKER_RESET_TIMEOUT))},
+    )
+
+
 app.include_router(auth.router)
 app.include_router(waitlist.router)
 app.include_router(import_router.router)
 app.include_router(transaction.router)
 app.include_router(account.router)
 app.include_router(connection.router)
+app.include_router(institution.router)
+app.include_router(metrics.router)
 
 
 @app.get("/hcaptcha/sitekey")
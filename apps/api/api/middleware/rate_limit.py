@@ -0,0 +1,250 @@
+"""
+Admission control for the expensive routes.
+
+Each route class has a cap on the requests it handles at once in each process,
+and sliding-window limits per client IP and per user, shared through Redis.
+Requests over a limit are rejected before any of the route's work is done.
+
+The cap protects the process's own event loop and password hashing threads,
+so it isn't shared: a deployment handles up to the cap times its number of
+worker processes at once. The sliding windows are what limit clients overall.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import re
+import secrets
+import time
+from collections import defaultdict
+from collections.abc import Iterable
+from typing import NamedTuple
+
+from redis.exceptions import RedisError
+from starlette.requests import HTTPConnection
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from api.core.config import settings
+from api.core.metrics import Metric, register_collector
+from api.core.redis import get_async_redis_client
+from api.core.security import decode_jwt
+
+logger = logging.getLogger(__name__)
+
+
+class Limit(NamedTuple):
+    requests: int
+    window: int  # seconds
+
+
+class RouteClass(NamedTuple):
+    name: str
+    method: str
+    path: re.Pattern[str]
+    # Requests handled at once by each worker process, see above
+    process_concurrency: int
+    ip_limit: Limit | None = None
+    user_limit: Limit | None = None
+
+
+ROUTE_CLASSES = [
+    RouteClass(
+        "login",
+        "POST",
+        re.compile(r"/auth/login/password"),
+        process_concurrency=16,
+        ip_limit=Limit(10, 60),
+    ),
+    RouteClass(
+        "register",
+        "POST",
+        re.compile(r"/auth/register"),
+        process_concurrency=4,
+        ip_limit=Limit(5, 60 * 10),
+    ),
+    RouteClass(
+        "waitlist",
+        "POST",
+        re.compile(r"/waitlist/join"),
+        process_concurrency=4,
+        ip_limit=Limit(5, 60 * 10),
+    ),
+    RouteClass(
+        "import",
+        "POST",
+        re.compile(r"/import/gocardless/[^/]+"),
+        process_concurrency=8,
+        ip_limit=Limit(30, 60 * 60),
+        user_limit=Limit(10, 60 * 60),
+    ),
+]
+
+# Checks every window first, so a rejected request doesn't count against any.
+# KEYS are the windows, ARGV is the time in ms, a unique member, then the
+# limit and window length in ms of each key. Returns the ms to wait, 0 if the
+# request was admitted.
+SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local retry_after = 0
+
+for i, key in ipairs(KEYS) do
+    local limit = tonumber(ARGV[2 * i + 1])
+    local window = tonumber(ARGV[2 * i + 2])
+
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+
+    if redis.call('ZCARD', key) >= limit then
+        local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+        retry_after = math.max(retry_after, tonumber(oldest[2]) + window - now)
+    end
+end
+
+if retry_after > 0 then
+    return retry_after
+end
+
+for i, key in ipairs(KEYS) do
+    redis.call('ZADD', key, now, ARGV[2])
+    redis.call('PEXPIRE', key, tonumber(ARGV[2 * i + 2]))
+end
+
+return 0
+"""
+
+# Seconds to wait for Redis before admitting the request without a check
+REDIS_TIMEOUT = 0.5
+
+_sliding_window = get_async_redis_client().register_script(SLIDING_WINDOW_SCRIPT)
+
+# Per process, so their metrics are labelled with it
+_in_flight: dict[str, int] = defaultdict(int)
+_rejections: dict[tuple[str, str], int] = defaultdict(int)
+
+
+def _route_path(scope: Scope) -> str:
+    path: str = scope["path"]
+    root_path: str = scope.get("root_path", "")
+
+    if root_path and path.startswith(root_path):
+        return path[len(root_path) :]
+
+    return path
+
+
+class RateLimitMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.RATE_LIMIT_ENABLED:
+            return await self.app(scope, receive, send)
+
+        route_class = self._match(scope)
+
+        if route_class is None:
+            return await self.app(scope, receive, send)
+
+        if _in_flight[route_class.name] >= route_class.process_concurrency:
+            _rejections[route_class.name, "concurrency"] += 1
+            response = JSONResponse(
+                {"detail": "Server is busy, try again"},
+                status_code=503,
+                headers={"Retry-After": "1"},
+            )
+            return await response(scope, receive, send)
+
+        _in_flight[route_class.name] += 1
+        try:
+            retry_after = await self._check_limits(scope, route_class)
+
+            if retry_after is not None:
+                _rejections[route_class.name, "rate_limit"] += 1
+                response = JSONResponse(
+                    {"detail": "Too many requests, try again later"},
+                    status_code=429,
+                    headers={"Retry-After": str(retry_after)},
+                )
+                return await response(scope, receive, send)
+
+            await self.app(scope, receive, send)
+        finally:
+            _in_flight[route_class.name] -= 1
+
+    def _match(self, scope: Scope) -> RouteClass | None:
+        path = _route_path(scope)
+
+        for route_class in ROUTE_CLASSES:
+            if scope["method"] != route_class.method:
+                continue
+
+            if route_class.path.fullmatch(path):
+                return route_class
+
+        return None
+
+    async def _check_limits(self, scope: Scope, route_class: RouteClass) -> int | None:
+        """Returns the seconds to wait if the request is over a limit."""
+        connection = HTTPConnection(scope)
+        prefix = f"{settings.REDIS_PREFIX}ratelimit:{route_class.name}"
+        windows: list[tuple[str, Limit]] = []
+
+        if route_class.ip_limit and connection.client:
+            windows.append(
+                (f"{prefix}:ip:{connection.client.host}", route_class.ip_limit)
+            )
+
+        if route_class.user_limit:
+            access_token = connection.cookies.get("access_token")
+            payload = decode_jwt(access_token) if access_token else None
+
+            # Unauthenticated requests are rejected by the route itself
+            if payload is not None:
+                windows.append((f"{prefix}:user:{payload.sub}", route_class.user_limit))
+
+        if not windows:
+            return None
+
+        args: list[int | str] = [int(time.time() * 1000), secrets.token_hex(8)]
+        for _, limit in windows:
+            args.extend([limit.requests, limit.window * 1000])
+
+        try:
+            async with asyncio.timeout(REDIS_TIMEOUT):
+                retry_after_ms = int(
+                    await _sliding_window(keys=[key for key, _ in windows], args=args)
+                )
+        except (RedisError, TimeoutError) as e:
+            # Better to let requests through than to take the routes down with Redis
+            logger.warning("Rate limit check failed, admitting request: %r", e)
+            return None
+
+        if retry_after_ms <= 0:
+            return None
+
+        return math.ceil(retry_after_ms / 1000)
+
+
+@register_collector
+def collect_rate_limit_metrics() -> Iterable[Metric]:
+    pid = str(os.getpid())
+
+    yield Metric(
+        "rate_limit_in_flight",
+        "gauge",
+        "Requests currently handled per route class by this process",
+        [
+            ({"route_class": name, "pid": pid}, count)
+            for name, count in _in_flight.items()
+        ],
+    )
+    yield Metric(
+        "rate_limit_rejections_total",
+        "counter",
+        "Requests rejected per route class and reason by this process",
+        [
+            ({"route_class": name, "reason": reason, "pid": pid}, count)
+            for (name, reason), count in _rejections.items()
+        ],
+    )
@@ -1,4 +1,6 @@
 from .account import Account
+from .account_daily_summary import AccountDailySummary
+from .account_sync_state import AccountSyncState
 from .connection import Connection
 from .counterparty import Counterparty
 from .merchant import Merchant
@@ -7,4 +9,13 @@ from .user import User
 
 TransactionReadRelations.model_rebuild()
 
-__all__ = ["Account", "Connection", "Counterparty", "Merchant", "Transaction", "User"]
+__all__ = [
+    "Account",
+    "AccountDailySummary",
+    "AccountSyncState",
+    "Connection",
+    "Counterparty",
+    "Merchant",
+    "Transaction",
+    "User",
+]
@@ -35,6 +35,13 @@ class AccountBase(SQLModel):
 
 class Account(AccountBase, BaseModel, table=True):
     id: str = Field(default_factory=generate, primary_key=True)
+    # Denormalized from the connection, so user queries don't need to join it
+    user_id: str = Field(foreign_key="user.id", index=True)
+
+    # Sum of the native amounts of all transactions, maintained by the importer
+    transaction_balance: float = Field(
+        default=0.0, sa_column_kwargs={"server_default": "0"}
+    )
 
     connection: "Connection" = Relationship(back_populates="accounts")
     transactions: list["Transaction"] = Relationship(
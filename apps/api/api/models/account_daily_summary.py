@@ -0,0 +1,24 @@
+from datetime import date
+
+from sqlmodel import Field, Index, SQLModel
+
+
+class AccountDailySummary(SQLModel, table=True):
+    """Per-day totals of an account's transactions, maintained by the importer."""
+
+    __tablename__ = "account_daily_summary"
+    __table_args__ = (Index("ix_account_daily_summary_user_day", "user_id", "day"),)
+
+    account_id: str = Field(foreign_key="account.id", primary_key=True)
+    day: date = Field(primary_key=True)
+    user_id: str = Field(foreign_key="user.id")
+
+    # In the transaction currency, like Transaction.amount
+    income: float = 0.0
+    expense: float = 0.0
+
+    # In the account currency, like Transaction.native_amount
+    native_income: float = 0.0
+    native_expense: float = 0.0
+
+    transaction_count: int = 0
@@ -0,0 +1,14 @@
+from datetime import date, datetime
+
+from sqlmodel import Field, SQLModel
+
+
+class AccountSyncState(SQLModel, table=True):
+    """How far an account has been imported, so later imports fetch only new data."""
+
+    __tablename__ = "account_sync_state"
+
+    account_id: str = Field(foreign_key="account.id", primary_key=True)
+    last_synced_at: datetime
+    # Newest booking date seen, later imports fetch from a few days before it
+    last_booking_date: date | None = None
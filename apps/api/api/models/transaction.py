@@ -54,11 +54,20 @@ class TransactionBase(SQLModel):
             "account_id",
             "processing_status",
         ),
+        # Serves the user's timeline, newest first, with the ID breaking ties
+        Index(
+            "ix_transaction_user_booking_time_id",
+            "user_id",
+            text("booking_time DESC"),
+            text("id DESC"),
+        ),
     )
 
 
 class Transaction(TransactionBase, BaseModel, table=True):
     id: str = Field(default_factory=generate, primary_key=True)
+    # Denormalized from the account, so user queries don't need to join it
+    user_id: str = Field(foreign_key="user.id")
 
     account: "Account" = Relationship(
         back_populates="transactions",
@@ -19,6 +19,8 @@ class UserBase(SQLModel):
 class User(UserBase, BaseModel, table=True):
     id: str = Field(default_factory=generate, primary_key=True)
     password_hash: str
+    # Embedded in issued tokens, incrementing it revokes all of them
+    session_epoch: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
 
     connections: list["Connection"] = Relationship(back_populates="user")
     created_counterparties: list["Counterparty"] = Relationship(
@@ -1,16 +1,16 @@
-from datetime import datetime, timedelta
+from datetime import date, timedelta
 from typing import Annotated
 
 from fastapi import APIRouter, Depends
 from pydantic import BaseModel
-from sqlalchemy import and_, case, func
-from sqlmodel import Session, select
+from sqlalchemy import func
+from sqlmodel import Session, col, select
 
-from api.db.database import get_db
+from api.db.query_budget import query_budget
+from api.db.statements import accounts_by_user
 from api.dependencies import get_user
-from api.models.account import Account, AccountRead
-from api.models.connection import Connection
-from api.models.transaction import Transaction
+from api.models.account import AccountRead
+from api.models.account_daily_summary import AccountDailySummary
 from api.models.user import User
 
 router = APIRouter(prefix="/account", tags=["Account"])
@@ -23,33 +23,17 @@ class AccountReadWithBalance(AccountRead):
 @router.get("")
 def get_accounts(
     user: Annotated[User, Depends(get_user)],
-    db: Annotated[Session, Depends(get_db)],
+    db: Annotated[Session, Depends(query_budget(1))],
 ) -> list[AccountReadWithBalance]:
-    # Query to get accounts with calculated balance
-    query = (
-        select(  # type: ignore[var-annotated]
-            Account,
-            (
-                func.coalesce(func.sum(Transaction.native_amount), 0)
-                + Account.balance_offset
-            ).label("balance"),
-        )
-        .join(Connection)
-        .outerjoin(Transaction, Account.id == Transaction.account_id)  # type: ignore[arg-type]
-        .where(Connection.user_id == user.id)
-        .group_by(Account.id)
-    )
+    accounts = db.scalars(accounts_by_user(user.id)).all()
 
-    results = db.exec(query).all()
-
-    # Convert results to AccountReadWithBalance objects
-    accounts = []
-    for account, balance in results:
-        accounts.append(
-            AccountReadWithBalance.model_validate(account, update={"balance": balance})
+    return [
+        AccountReadWithBalance.model_validate(
+            account,
+            update={"balance": account.transaction_balance + account.balance_offset},
         )
-
-    return accounts
+        for account in accounts
+    ]
 
 
 class AccountStatistics(BaseModel):
@@ -60,32 +44,20 @@ class AccountStatistics(BaseModel):
 @router.get("/statistics")
 def get_account_statistics(
     user: Annotated[User, Depends(get_user)],
-    db: Annotated[Session, Depends(get_db)],
+    db: Annotated[Session, Depends(query_budget(1))],
 ) -> AccountStatistics:
-    now = datetime.now()
-    thirty_days_ago = now - timedelta(days=30)
-
-    query = (
-        select(
-            func.coalesce(
-                func.sum(case((Transaction.amount > 0, Transaction.amount), else_=0)),  # type: ignore[arg-type]
-                0,
-            ).label("last_30d_income"),
-            func.coalesce(
-                func.sum(case((Transaction.amount < 0, -Transaction.amount), else_=0)),  # type: ignore[arg-type]
-                0,
-            ).label("last_30d_expense"),
-        )
-        .select_from(Account)
-        .join(Connection)
-        .outerjoin(Transaction, Account.id == Transaction.account_id)  # type: ignore[arg-type]
-        .where(
-            and_(
-                Connection.user_id == user.id,  # type: ignore[arg-type]
-                Transaction.booking_time >= thirty_days_ago,  # type: ignore[arg-type]
-                Transaction.booking_time < now,  # type: ignore[arg-type]
-            )
-        )
+    today = date.today()
+    thirty_days_ago = today - timedelta(days=30)
+
+    query = select(  # type: ignore[var-annotated]
+        func.coalesce(func.sum(AccountDailySummary.income), 0).label("last_30d_income"),
+        func.coalesce(func.sum(AccountDailySummary.expense), 0).label(
+            "last_30d_expense"
+        ),
+    ).where(
+        AccountDailySummary.user_id == user.id,
+        col(AccountDailySummary.day) > thirty_days_ago,
+        col(AccountDailySummary.day) <= today,
     )
 
     result = db.exec(query).first()
@@ -1,28 +1,27 @@
-from math import floor
+import time
+from math import ceil, floor
 from typing import Annotated
 
 from fastapi import APIRouter, Cookie, Depends, HTTPException, Response, status
 from fastapi.responses import RedirectResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from api.core.config import settings
+from api.core.hashing import get_password_hash_async, verify_password_async
 from api.core.rabbitmq import RabbitMQConnection, get_rabbitmq
 from api.core.redis import (
     blacklist_token,
+    get_token_blacklist_time,
     is_email_pending,
-    is_token_blacklisted,
     pop_temp_user,
     store_temp_user,
 )
-from api.core.security import (
-    create_token,
-    decode_jwt,
-    get_password_hash,
-    verify_password,
-)
-from api.db.database import get_db
-from api.dependencies import verify_hcaptcha
+from api.core.security import create_token, decode_jwt
+from api.db.database import get_async_db
+from api.db.user_cache import get_cached_user
+from api.dependencies import get_user, verify_hcaptcha
 from api.models.user import User, UserCreate
 from api.schemas.base import ErrorResponse, MessageResponse
 from api.schemas.emails import ConfirmEmail, ConfirmEmailPayload
@@ -30,26 +29,41 @@ from api.schemas.emails import ConfirmEmail, ConfirmEmailPayload
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
 
+async def revoke_sessions(db: AsyncSession, user_id: str) -> None:
+    """Invalidate every token issued to the user by bumping their session epoch."""
+    user = await db.get(User, user_id)
+
+    if user is None:
+        return
+
+    user.session_epoch += 1
+    await db.commit()
+
+
 @router.post(
     "/login/password",
-    responses={status.HTTP_401_UNAUTHORIZED: {"model": ErrorResponse}},
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {"model": ErrorResponse},
+        status.HTTP_503_SERVICE_UNAVAILABLE: {"model": ErrorResponse},
+    },
 )
 async def password_login(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
     response: Response,
-    db: Annotated[Session, Depends(get_db)],
+    db: Annotated[AsyncSession, Depends(get_async_db)],
     _: Annotated[bool, Depends(verify_hcaptcha)],
 ) -> MessageResponse:
-    user = db.exec(select(User).where(User.email == form_data.username)).one_or_none()
+    result = await db.exec(select(User).where(User.email == form_data.username))
+    user = result.one_or_none()
 
     if user is None:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    if not verify_password(form_data.password, user.password_hash):
+    if not await verify_password_async(form_data.password, user.password_hash):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    access_token = create_token(user.id, "access")
-    refresh_token = create_token(user.id, "refresh")
+    access_token = create_token(user.id, "access", user.session_epoch)
+    refresh_token = create_token(user.id, "refresh", user.session_epoch)
 
     response.set_cookie(
         key="access_token",
@@ -83,25 +97,29 @@ async def password_login(
 
 @router.post(
     "/register",
-    responses={status.HTTP_400_BAD_REQUEST: {"model": ErrorResponse}},
+    responses={
+        status.HTTP_400_BAD_REQUEST: {"model": ErrorResponse},
+        status.HTTP_503_SERVICE_UNAVAILABLE: {"model": ErrorResponse},
+    },
 )
 async def register(
     user: UserCreate,
-    db: Annotated[Session, Depends(get_db)],
+    db: Annotated[AsyncSession, Depends(get_async_db)],
     rmq: Annotated[RabbitMQConnection, Depends(get_rabbitmq)],
     _: Annotated[bool, Depends(verify_hcaptcha)],
 ) -> MessageResponse:
     if not settings.SIGNUP_ENABLED:
         raise HTTPException(status_code=400, detail="Signup is disabled")
 
-    user_exists = db.exec(select(User).where(User.email == user.email)).one_or_none()
+    result = await db.exec(select(User).where(User.email == user.email))
+    user_exists = result.one_or_none()
     email_pending = is_email_pending(user.email)
 
     if user_exists or email_pending:
         raise HTTPException(status_code=400, detail="Email already in use")
 
     db_user = User.model_validate(
-        user, update={"password_hash": get_password_hash(user.password)}
+        user, update={"password_hash": await get_password_hash_async(user.password)}
     )
 
     email_token = create_token(db_user.id, "email")
@@ -129,7 +147,7 @@ async def register(
 @router.get("/confirm-email/{email_token}")
 async def confirm_email(
     email_token: str,
-    db: Annotated[Session, Depends(get_db)],
+    db: Annotated[AsyncSession, Depends(get_async_db)],
 ) -> RedirectResponse:
     payload = decode_jwt(email_token)
 
@@ -142,10 +160,10 @@ async def confirm_email(
         raise HTTPException(status_code=400, detail="Invalid email token")
 
     db.add(user)
-    db.commit()
+    await db.commit()
 
-    access_token = create_token(user.id, "access")
-    refresh_token = create_token(user.id, "refresh")
+    access_token = create_token(user.id, "access", user.session_epoch)
+    refresh_token = create_token(user.id, "refresh", user.session_epoch)
 
     response = RedirectResponse(
         url="/auth/login",
@@ -187,16 +205,35 @@ async def confirm_email(
 async def refresh_token(
     refresh_token: Annotated[str, Cookie()],
     response: Response,
+    db: Annotated[AsyncSession, Depends(get_async_db)],
 ) -> MessageResponse:
+    """Issue a new access token and rotate the refresh token."""
     payload = decode_jwt(refresh_token)
 
     if payload is None or payload.typ != "refresh":
         raise HTTPException(status_code=401, detail="Invalid refresh token")
 
-    if is_token_blacklisted(payload.jti):
+    user = await get_cached_user(db, payload.sub)
+
+    if user is None or payload.sep != user.session_epoch:
+        raise HTTPException(status_code=401, detail="Refresh token has been revoked")
+
+    # Each refresh token can be used once, a second use means it was copied
+    expires_in = max(ceil(payload.exp.timestamp() - time.time()), 1)
+
+    if not blacklist_token(payload.jti, expires_in):
+        blacklisted_at = get_token_blacklist_time(payload.jti)
+
+        if (
+            blacklisted_at is not None
+            and time.time() - blacklisted_at > settings.REFRESH_TOKEN_REUSE_GRACE
+        ):
+            await revoke_sessions(db, user.id)
+
         raise HTTPException(status_code=401, detail="Refresh token has been revoked")
 
-    access_token = create_token(payload.sub, "access")
+    access_token = create_token(user.id, "access", user.session_epoch)
+    new_refresh_token = create_token(user.id, "refresh", user.session_epoch)
 
     response.set_cookie(
         key="access_token",
@@ -216,6 +253,15 @@ async def refresh_token(
         max_age=settings.ACCESS_TOKEN_EXPIRATION,
     )
 
+    response.set_cookie(
+        key="refresh_token",
+        value=new_refresh_token.token,
+        httponly=True,
+        secure=True,
+        samesite="strict",
+        max_age=settings.REFRESH_TOKEN_EXPIRATION,
+    )
+
     return MessageResponse(message="Token refreshed")
 
 
@@ -225,15 +271,14 @@ async def logout(
     access_token: Annotated[str | None, Cookie()] = None,
     refresh_token: Annotated[str | None, Cookie()] = None,
 ) -> MessageResponse:
-    if access_token:
-        access_payload = decode_jwt(access_token)
-        if access_payload:
-            blacklist_token(access_payload.jti, settings.ACCESS_TOKEN_EXPIRATION)
-
-    if refresh_token:
-        refresh_payload = decode_jwt(refresh_token)
-        if refresh_payload:
-            blacklist_token(refresh_payload.jti, settings.REFRESH_TOKEN_EXPIRATION)
+    """Log out of this device, use `/logout-all` to log out of every device."""
+    # Blacklisted until they expire on their own
+    for token in (access_token, refresh_token):
+        payload = decode_jwt(token) if token else None
+        if payload:
+            blacklist_token(
+                payload.jti, max(ceil(payload.exp.timestamp() - time.time()), 1)
+            )
 
     # Clear the cookies
     response.delete_cookie("refresh_token")
@@ -241,3 +286,20 @@ async def logout(
     response.delete_cookie("access_token_expiration")
 
     return MessageResponse(message="Logged out successfully")
+
+
+@router.post("/logout-all")
+async def logout_all(
+    user: Annotated[User, Depends(get_user)],
+    response: Response,
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+) -> MessageResponse:
+    """Log out of every device by revoking all of the user's tokens."""
+    await revoke_sessions(db, user.id)
+
+    # Clear the cookies
+    response.delete_cookie("refresh_token")
+    response.delete_cookie("access_token")
+    response.delete_cookie("access_token_expiration")
+
+    return MessageResponse(message="Logged out of all devices successfully")
@@ -14,6 +14,7 @@ from api.core.gocardless import (
 )
 from api.core.redis import get_gocardless_requisition, store_gocardless_requisition
 from api.db.database import get_db
+from api.db.query_budget import query_budget
 from api.dependencies import get_user
 from api.models.connection import Connection, ConnectionRead, ConnectionType
 from api.models.user import User
@@ -25,7 +26,7 @@ router = APIRouter(prefix="/connection", tags=["Account Connection"])
 @router.get("")
 def get_connections(
     user: Annotated[User, Depends(get_user)],
-    db: Annotated[Session, Depends(get_db)],
+    db: Annotated[Session, Depends(query_budget(1))],
 ) -> list[ConnectionRead]:
     return [
         ConnectionRead.model_validate(connection)
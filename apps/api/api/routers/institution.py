@@ -0,0 +1,47 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Query
+from pydantic import BaseModel
+
+from api.core.institution_search import get_institution_index
+from api.dependencies import get_user
+from api.models.user import User
+
+router = APIRouter(prefix="/institution", tags=["Institutions"])
+
+
+class InstitutionSearchResult(BaseModel):
+    id: str
+    name: str
+    bic: str
+    logo: str
+
+
+class InstitutionSearchResponse(BaseModel):
+    total: int
+    results: list[InstitutionSearchResult]
+
+
+@router.get("/search")
+def search_institutions(
+    _: Annotated[User, Depends(get_user)],
+    q: Annotated[str, Query(max_length=100)] = "",
+    country: Annotated[str | None, Query(min_length=2, max_length=2)] = None,
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+    offset: Annotated[int, Query(ge=0)] = 0,
+) -> InstitutionSearchResponse:
+    """Institutions whose name or BIC words start with the words of `q`."""
+    total, institutions = get_institution_index().search(q, country, limit, offset)
+
+    return InstitutionSearchResponse(
+        total=total,
+        results=[
+            InstitutionSearchResult(
+                id=institution.id,
+                name=institution.name,
+                bic=institution.bic,
+                logo=institution.logo,
+            )
+            for institution in institutions
+        ],
+    )
@@ -0,0 +1,29 @@
+import secrets
+from typing import Annotated
+
+from fastapi import APIRouter, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
+
+from api.core.config import settings
+from api.core.metrics import render_metrics
+
+router = APIRouter(tags=["Metrics"], include_in_schema=False)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics(
+    authorization: Annotated[str | None, Header()] = None,
+) -> PlainTextResponse:
+    # Pool internals aren't public, the endpoint doesn't exist until a token is set
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    if not secrets.compare_digest(
+        authorization or "", f"Bearer {settings.METRICS_TOKEN}"
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+        )
+
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
@@ -1,34 +1,67 @@
+import base64
+import binascii
+from datetime import datetime
 from typing import Annotated
 
-from fastapi import APIRouter, Depends
-from sqlmodel import Session, col, select
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlmodel import Session
 
-from api.db.database import get_db
+from api.db.query_budget import query_budget
+from api.db.statements import transaction_page
 from api.dependencies import get_user
-from api.models.connection import Connection
 from api.models.transaction import Transaction, TransactionReadRelations
 from api.models.user import User
+from api.schemas.base import ErrorResponse
 
 router = APIRouter(prefix="/transaction", tags=["Transaction"])
 
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
 
-@router.get("")
+
+def encode_cursor(transaction: Transaction) -> str:
+    raw = f"{transaction.booking_time.isoformat()}|{transaction.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        booking_time, transaction_id = raw.split("|", 1)
+        return datetime.fromisoformat(booking_time), transaction_id
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        ) from e
+
+
+@router.get(
+    "",
+    responses={status.HTTP_400_BAD_REQUEST: {"model": ErrorResponse}},
+)
 def get_transactions(
     user: Annotated[User, Depends(get_user)],
-    db: Annotated[Session, Depends(get_db)],
-    offset: int = 0,
-    limit: int = 100,
+    # One query for the page, one per relationship loaded in bulk
+    db: Annotated[Session, Depends(query_budget(5))],
+    response: Response,
+    cursor: str | None = None,
+    offset: Annotated[int, Query(ge=0, deprecated=True)] = 0,
+    limit: Annotated[int, Query(ge=1, le=500)] = 100,
 ) -> list[TransactionReadRelations]:
-    transactions = db.exec(
-        select(Transaction)
-        # mypy complains about the arg type, but it's correct
-        .join(Transaction.account)  # type: ignore[arg-type]
-        .join(Connection)
-        .where(Connection.user_id == user.id)
-        .order_by(col(Transaction.booking_time).desc())
-        .offset(offset)
-        .limit(limit)
+    """
+    List the user's transactions, newest first.
+
+    When there are more results, the `X-Next-Cursor` response header holds the
+    cursor for the next page.
+    """
+    decoded_cursor = decode_cursor(cursor) if cursor is not None else None
+
+    transactions = db.scalars(
+        transaction_page(user.id, limit, decoded_cursor, offset)
     ).all()
 
+    if transactions and len(transactions) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(transactions[-1])
+
     # FastAPI would handle the conversion, but mypy doesn't know that
     return [TransactionReadRelations.model_validate(t) for t in transactions]
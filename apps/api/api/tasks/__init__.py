@@ -1,4 +1,10 @@
+from .account import reconcile_balances, reconcile_daily_summaries
 from .gocardless import import_requisition
 from .transaction import process_transactions
 
-__all__ = ["import_requisition", "process_transactions"]
+__all__ = [
+    "import_requisition",
+    "process_transactions",
+    "reconcile_balances",
+    "reconcile_daily_summaries",
+]
@@ -0,0 +1,33 @@
+from sqlmodel import Session
+
+from api.core.celery import app
+from api.db.database import engine
+from api.db.ledger import rebuild_balances, rebuild_daily_summaries
+
+
+@app.task
+def reconcile_balances(account_id: str | None = None) -> dict[str, int]:
+    """
+    Rebuild the stored account balances from the transactions.
+
+    Rebuilds every account when no account ID is given.
+    """
+    with Session(engine) as session:
+        reconciled_count = rebuild_balances(session, account_id)
+
+        session.commit()
+        return {"reconciled_accounts": reconciled_count}
+
+
+@app.task
+def reconcile_daily_summaries(account_id: str | None = None) -> dict[str, int]:
+    """
+    Rebuild the daily account summaries from the transactions.
+
+    Rebuilds every account when no account ID is given.
+    """
+    with Session(engine) as session:
+        summary_count = rebuild_daily_summaries(session, account_id)
+
+        session.commit()
+        return {"summary_rows": summary_count}
@@ -1,26 +1,42 @@
-from datetime import datetime
-
-from celery import group
+import asyncio
+import logging
+from collections.abc import Iterable
+from datetime import date
+from itertools import batched
+from typing import NamedTuple
+
+from celery import Task, group
 from sqlalchemy import text
 from sqlmodel import Session, col, select
 
 from api.core.celery import app
+from api.core.config import settings
 from api.core.exceptions import (
     ConnectionMissingDataError,
     ConnectionNotFoundError,
-    TransactionMissingDataError,
+    GoCardlessRateLimitError,
 )
-from api.core.gocardless import (
-    get_account_details,
-    get_institution,
-    get_requisition,
-    get_transactions,
+from api.core.gocardless import get_requisition
+from api.core.gocardless_async import fetch_accounts
+from api.core.gocardless_normalize import TransactionNormalizer
+from api.core.gocardless_quota import (
+    claim_account_imports,
+    extend_account_imports,
+    get_account_quotas,
+    get_cached_account_details,
+    release_account_imports,
 )
 from api.db.database import engine
+from api.db.ledger import apply_ledger_deltas, transaction_ledger_returning
+from api.db.sync_state import get_sync_start_dates, record_sync
 from api.db.utils import upsert_db
 from api.models.account import Account, AccountType, ISOAccountType
 from api.models.connection import Connection
 from api.models.transaction import ProcessingStatus, Transaction
+from api.schemas.gocardless import AccountDetails, Institution
+from api.schemas.gocardless import Transaction as GoCardlessTransaction
+
+logger = logging.getLogger(__name__)
 
 account_index_elements = ["internal_id"]
 account_columns = Account.model_fields.keys()
@@ -29,11 +45,13 @@ account_exclude_columns = {
     "created_at",
     "updated_at",  # We handle this manually with text("now()")
     "connection_id",
+    "user_id",
     "internal_id",
     # User managed columns
     "name",
     "notes",
     "balance_offset",
+    "transaction_balance",  # Maintained from the transaction upserts
 }
 account_update_columns = [
     col for col in account_columns if col not in account_exclude_columns
@@ -49,6 +67,7 @@ transaction_exclude_columns = {
     "created_at",
     "updated_at",  # We handle this manually with text("now()")
     "account_id",
+    "user_id",
     "opposing_counterparty_id",  # Reset on change
     "opposing_account_id",  # Reset on change
     "gocardless_id",
@@ -60,115 +79,224 @@ transaction_update_columns = [
 ]
 
 
-@app.task
-def import_account(account_id: str, connection_id: str, institution_id: str) -> None:
-    with Session(engine) as session:
-        details = get_account_details(account_id)
-        transactions = get_transactions(account_id)
-
-        institution = get_institution(institution_id)
-
-        fallback_name = f"{institution.name} {details.currency}"
-
-        db_account = Account(
-            connection_id=connection_id,
-            name=details.displayName or details.name or fallback_name,
-            currency=details.currency,
-            account_type=AccountType.BANK_GOCARDLESS,
-            balance_offset=0.0,
-            iban=details.iban,
-            bban=details.bban,
-            bic=details.bic,
-            scan_code=details.scan,
-            internal_id=account_id,
-            owner_name=details.ownerName,
-            usage_type=details.usage,
-            iso_account_type=ISOAccountType(details.cashAccountType),
-        )
+class ImportPlan(NamedTuple):
+    # Accounts to fetch now, some with their details from the cache
+    account_ids: list[str]
+    cached_details: dict[str, AccountDetails]
+    # Accounts out of quota, with the seconds until it resets
+    deferred: dict[str, int]
 
-        upsert_db(
-            [db_account.model_dump()],
-            session,
-            model=Account,
-            update_whitelist=account_update_columns,
-            index_elements=account_index_elements,
-            update_override={"updated_at": text("now()")},
+
+def plan_imports(account_ids: list[str]) -> ImportPlan:
+    """Decide which accounts can be fetched without exceeding their quota."""
+    deferred = {
+        account_id: quota.reset_in
+        for account_id, quota in get_account_quotas(account_ids, "transactions").items()
+        if quota.exhausted
+    }
+
+    cached_details = get_cached_account_details(
+        account_id for account_id in account_ids if account_id not in deferred
+    )
+
+    for account_id, quota in get_account_quotas(
+        (
+            account_id
+            for account_id in account_ids
+            if account_id not in deferred and account_id not in cached_details
+        ),
+        "details",
+    ).items():
+        if quota.exhausted:
+            deferred[account_id] = quota.reset_in
+
+    return ImportPlan(
+        [account_id for account_id in account_ids if account_id not in deferred],
+        cached_details,
+        deferred,
+    )
+
+
+def defer_imports(
+    deferred: dict[str, int], connection_id: str, institution_id: str
+) -> None:
+    """
+    Import the accounts that are out of quota once it resets.
+
+    Quotas resetting later than `GOCARDLESS_TASK_MAX_RETRY_WAIT` are left to
+    the next import, instead of holding a task for hours.
+    """
+    soon = [
+        account_id
+        for account_id, reset_in in deferred.items()
+        if reset_in <= settings.GOCARDLESS_TASK_MAX_RETRY_WAIT
+    ]
+    later = [account_id for account_id in deferred if account_id not in soon]
+
+    if later:
+        logger.info("Skipping GoCardless accounts out of quota: %s", later)
+        release_account_imports(later)
+
+    if soon:
+        countdown = max(deferred[account_id] for account_id in soon) + 1
+
+        # Imports requested in the meantime are coalesced into this one
+        extend_account_imports(soon, countdown + settings.GOCARDLESS_IMPORT_CLAIM_TTL)
+        import_accounts.apply_async(
+            (soon, connection_id, institution_id), countdown=countdown
         )
 
-        account_mapping = {
-            account.internal_id: account.id
-            for account in session.exec(
-                select(Account).where(
-                    Account.connection_id == connection_id,
-                    col(Account.internal_id).isnot(None),
-                )
-            )
-        }
 
-        transactions_to_upsert = []
+@app.task(bind=True, max_retries=3)
+def import_accounts(
+    self: Task[..., None],
+    account_ids: list[str],
+    connection_id: str,
+    institution_id: str,
+) -> None:
+    """
+    Import several accounts of a connection, fetching them concurrently.
 
-        for transaction in transactions.booked:
-            opposing_account = (
-                transaction.creditorAccount
-                if transaction.transactionAmount.amount < 0
-                else transaction.debitorAccount
-            )
+    Accounts out of quota are deferred, and details fetched recently are
+    reused, see `plan_imports`.
+    """
+    # Accounts whose claims passed to a scheduled task, the rest are released
+    handed_off: set[str] = set()
 
-            opposing_name = (
-                transaction.creditorName
-                if transaction.transactionAmount.amount < 0
-                else transaction.debitorName
-            )
+    with Session(engine) as session:
+        try:
+            connection = session.get(Connection, connection_id)
 
-            opposing_iban = opposing_account.iban if opposing_account else None
-            opposing_bban = opposing_account.bban if opposing_account else None
+            if not connection:
+                raise ConnectionNotFoundError(connection_id)
 
-            booking_time_str = transaction.bookingDateTime or transaction.bookingDate
-            value_time_str = transaction.valueDateTime or transaction.valueDate
+            plan = plan_imports(account_ids)
+            defer_imports(plan.deferred, connection_id, institution_id)
+            handed_off.update(plan.deferred)
 
-            if not booking_time_str:
-                raise TransactionMissingDataError(
-                    transaction.transactionId, "booking date"
+            if not plan.account_ids:
+                return
+
+            institution, results = asyncio.run(
+                fetch_accounts(
+                    plan.account_ids,
+                    institution_id,
+                    get_sync_start_dates(session, plan.account_ids),
+                    plan.cached_details,
+                )
+            )
+
+            # Accounts that were fetched are stored even if others failed
+            failures: dict[str, BaseException] = {}
+
+            for account_id, result in results.items():
+                if isinstance(result, BaseException):
+                    failures[account_id] = result
+                    continue
+
+                store_account(
+                    session,
+                    connection,
+                    account_id,
+                    result.details,
+                    result.transactions,
+                    institution,
                 )
 
-            booking_time = datetime.fromisoformat(booking_time_str)
-
-            if value_time_str:
-                value_time = datetime.fromisoformat(value_time_str)
-            else:
-                value_time = None
-
-            native_amount = transaction.transactionAmount.amount
-
-            if transaction.currencyExchange:
-                amount = transaction.currencyExchange.instructedAmount.amount
-                currency = transaction.currencyExchange.instructedAmount.currency
-
-                if native_amount < 0:
-                    amount = -amount
-            else:
-                amount = transaction.transactionAmount.amount
-                currency = transaction.transactionAmount.currency
-
-            db_transaction = Transaction(
-                account_id=account_mapping[account_id],
-                amount=amount,
-                currency=currency,
-                native_amount=native_amount,
-                processing_status=ProcessingStatus.UNPROCESSED,
-                opposing_name=opposing_name,
-                opposing_iban=opposing_iban,
-                opposing_bban=opposing_bban,
-                gocardless_id=transaction.internalTransactionId,
-                internal_id=transaction.transactionId,
-                booking_time=booking_time,
-                value_time=value_time,
+            if not failures:
+                return
+
+            rate_limited = [
+                e for e in failures.values() if isinstance(e, GoCardlessRateLimitError)
+            ]
+
+            # Only the failed accounts are retried, the others are already stored
+            if len(rate_limited) == len(failures):
+                retry_after = max(e.retry_after for e in rate_limited)
+
+                if retry_after <= settings.GOCARDLESS_TASK_MAX_RETRY_WAIT:
+                    # Raises instead when out of retries, so the claims are
+                    # only kept once the retry is actually scheduled
+                    retry = self.retry(
+                        args=(list(failures), connection_id, institution_id),
+                        exc=rate_limited[0],
+                        countdown=retry_after,
+                        throw=False,
+                    )
+                    handed_off.update(failures)
+                    raise retry
+
+            raise next(iter(failures.values()))
+        finally:
+            release_account_imports(
+                account_id for account_id in account_ids if account_id not in handed_off
             )
 
-            transactions_to_upsert.append(db_transaction.model_dump())
 
-        upsert_db(
-            transactions_to_upsert,
+def store_account(
+    session: Session,
+    connection: Connection,
+    account_id: str,
+    details: AccountDetails,
+    transactions: Iterable[GoCardlessTransaction],
+    institution: Institution,
+) -> None:
+    """Upsert a fetched account and its booked transactions, and commit."""
+    connection_id = connection.id
+    user_id = connection.user_id
+
+    fallback_name = f"{institution.name} {details.currency}"
+
+    db_account = Account(
+        connection_id=connection_id,
+        user_id=user_id,
+        name=details.displayName or details.name or fallback_name,
+        currency=details.currency,
+        account_type=AccountType.BANK_GOCARDLESS,
+        balance_offset=0.0,
+        iban=details.iban,
+        bban=details.bban,
+        bic=details.bic,
+        scan_code=details.scan,
+        internal_id=account_id,
+        owner_name=details.ownerName,
+        usage_type=details.usage,
+        iso_account_type=ISOAccountType(details.cashAccountType),
+    )
+
+    upsert_db(
+        [db_account.model_dump()],
+        session,
+        model=Account,
+        update_whitelist=account_update_columns,
+        index_elements=account_index_elements,
+        update_override={"updated_at": text("now()")},
+    )
+
+    account_mapping = {
+        account.internal_id: account.id
+        for account in session.exec(
+            select(Account).where(
+                Account.connection_id == connection_id,
+                col(Account.internal_id).isnot(None),
+            )
+        )
+    }
+
+    normalize = TransactionNormalizer(account_mapping[account_id], user_id)
+    last_booking_date: date | None = None
+
+    # Normalized and upserted in batches, so only one batch of the history is
+    # in memory at a time
+    for batch in batched(transactions, settings.GOCARDLESS_UPSERT_BATCH_SIZE):
+        rows = [normalize(transaction) for transaction in batch]
+
+        batch_last_booking_date = max(row["booking_time"].date() for row in rows)
+        if last_booking_date is None or batch_last_booking_date > last_booking_date:
+            last_booking_date = batch_last_booking_date
+
+        upserted_transactions = upsert_db(
+            rows,
             session,
             model=Transaction,
             update_whitelist=transaction_update_columns,
@@ -179,8 +307,16 @@ def import_account(account_id: str, connection_id: str, institution_id: str) ->
                 "opposing_counterparty_id": None,
                 "opposing_account_id": None,
             },
+            returning=transaction_ledger_returning,
+            commit=False,
         )
 
+        apply_ledger_deltas(session, upserted_transactions)
+
+    record_sync(session, account_mapping[account_id], last_booking_date)
+
+    session.commit()
+
 
 @app.task
 def import_requisition(connection_id: str) -> str:
@@ -195,14 +331,24 @@ def import_requisition(connection_id: str) -> str:
         if not connection.internal_id:
             raise ConnectionMissingDataError(connection_id, "internal ID")
 
-        account_ids = get_requisition(connection.internal_id).accounts
+        # Accounts still being imported by an earlier request are left to it
+        account_ids = claim_account_imports(
+            get_requisition(connection.internal_id).accounts
+        )
 
+        # Each task fetches its accounts concurrently, so a requisition takes a
+        # few worker slots instead of one per account
         account_tasks = group(
-            import_account.s(account_id, connection_id, connection.institution_id)
-            for account_id in account_ids
+            import_accounts.s(list(batch), connection_id, connection.institution_id)
+            for batch in batched(account_ids, settings.GOCARDLESS_IMPORT_BATCH_SIZE)
         )
 
-        result = account_tasks.apply_async()
+        try:
+            result = account_tasks.apply_async()
+        except BaseException:
+            # Nothing will import them, so don't keep later imports waiting
+            release_account_imports(account_ids)
+            raise
 
         # celery-types doesn't properly type this, this should be a GroupResult
         # not an AsyncResult, but that is also not properly typed
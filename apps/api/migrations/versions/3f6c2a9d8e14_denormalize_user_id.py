@@ -0,0 +1,98 @@
+"""denormalize user id onto accounts and transactions
+
+Revision ID: 3f6c2a9d8e14
+Revises: 9b3793922a47
+Create Date: 2026-10-18 12:24:07.518302
+
+"""
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f6c2a9d8e14'
+down_revision: str | None = '9b3793922a47'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+# Rows per backfill statement, so no single statement holds locks on the
+# whole transaction table
+BACKFILL_BATCH_SIZE = 10_000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('account', sa.Column('user_id', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.add_column('transaction', sa.Column('user_id', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.add_column('account_daily_summary', sa.Column('user_id', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+
+    op.execute(
+        'UPDATE account SET user_id = connection.user_id '
+        'FROM connection WHERE connection.id = account.connection_id'
+    )
+    op.execute(
+        'UPDATE account_daily_summary SET user_id = account.user_id '
+        'FROM account WHERE account.id = account_daily_summary.account_id'
+    )
+
+    # Each batch commits on its own. Batches are ranges of the primary key, so
+    # every batch is an index range scan instead of another full table scan.
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        last_id = ''
+        while True:
+            upper_id = connection.execute(
+                sa.text(
+                    'SELECT max(id) FROM ('
+                    'SELECT id FROM "transaction" WHERE id > :last_id '
+                    'ORDER BY id LIMIT :batch_size'
+                    ') AS batch'
+                ),
+                {'last_id': last_id, 'batch_size': BACKFILL_BATCH_SIZE},
+            ).scalar()
+            if upper_id is None:
+                break
+
+            connection.execute(
+                sa.text(
+                    'UPDATE "transaction" SET user_id = account.user_id '
+                    'FROM account '
+                    'WHERE account.id = "transaction".account_id '
+                    'AND "transaction".id > :last_id AND "transaction".id <= :upper_id'
+                ),
+                {'last_id': last_id, 'upper_id': upper_id},
+            )
+            last_id = upper_id
+
+    op.alter_column('account', 'user_id', nullable=False)
+    op.alter_column('transaction', 'user_id', nullable=False)
+    op.alter_column('account_daily_summary', 'user_id', nullable=False)
+
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_index(op.f('ix_account_user_id'), 'account', ['user_id'], unique=False)
+    op.create_foreign_key(None, 'account', 'user', ['user_id'], ['id'])
+    op.create_foreign_key(None, 'transaction', 'user', ['user_id'], ['id'])
+    op.create_index('ix_transaction_user_booking_time_id', 'transaction', ['user_id', sa.text('booking_time DESC'), sa.text('id DESC')], unique=False)
+    op.drop_index('ix_transaction_booking_time_id', table_name='transaction')
+    op.create_foreign_key(None, 'account_daily_summary', 'user', ['user_id'], ['id'])
+    op.create_index('ix_account_daily_summary_user_day', 'account_daily_summary', ['user_id', 'day'], unique=False)
+    # ### end Alembic commands ###
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_index('ix_account_daily_summary_user_day', table_name='account_daily_summary')
+    op.drop_constraint('account_daily_summary_user_id_fkey', 'account_daily_summary', type_='foreignkey')
+    op.drop_column('account_daily_summary', 'user_id')
+    op.create_index('ix_transaction_booking_time_id', 'transaction', ['booking_time', 'id'], unique=False)
+    op.drop_index('ix_transaction_user_booking_time_id', table_name='transaction')
+    op.drop_constraint('transaction_user_id_fkey', 'transaction', type_='foreignkey')
+    op.drop_column('transaction', 'user_id')
+    op.drop_constraint('account_user_id_fkey', 'account', type_='foreignkey')
+    op.drop_index(op.f('ix_account_user_id'), table_name='account')
+    op.drop_column('account', 'user_id')
+    # ### end Alembic commands ###
@@ -0,0 +1,43 @@
+"""
+Compare the per-request CPU cost of verifying an access token before and
+after the decoded-token cache.
+
+    uv run scripts/bench-auth.py [iterations]
+"""
+
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import jwt
+
+from api.core.config import settings
+from api.core.security import TokenPayload, create_token, decode_jwt
+
+
+def decode_uncached(token: str) -> TokenPayload:
+    """The previous implementation, a full decode and validation every time."""
+    payload_dict = jwt.decode(
+        token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM]
+    )
+    return TokenPayload(**payload_dict)
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+
+    token = create_token("user", "access").token
+    decode_jwt(token)
+
+    before = timeit.timeit(lambda: decode_uncached(token), number=iterations)
+    after = timeit.timeit(lambda: decode_jwt(token), number=iterations)
+
+    print(f"{'uncached':<10}{before / iterations * 1e6:>10.2f} µs/request")
+    print(f"{'cached':<10}{after / iterations * 1e6:>10.2f} µs/request")
+    print(f"{'speedup':<10}{before / after:>10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
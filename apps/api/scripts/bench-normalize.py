@@ -0,0 +1,127 @@
+"""
+Compare how many GoCardless transactions per second are turned into upsert
+rows, through a `Transaction` model and with the normalizer.
+
+    uv run scripts/bench-normalize.py [transactions]
+"""
+
+import random
+import sys
+import time
+from collections.abc import Callable
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from api.core.gocardless_normalize import TransactionNormalizer
+from api.models.transaction import ProcessingStatus, Transaction
+from api.schemas.gocardless import Transaction as GoCardlessTransaction
+
+
+def synthetic_transactions(count: int) -> list[GoCardlessTransaction]:
+    rng = random.Random(0)
+    start = date(2020, 1, 1)
+    transactions = []
+
+    for i in range(count):
+        day = start + timedelta(days=rng.randrange(5 * 365))
+        amount = round(rng.uniform(-500, 500), 2)
+        transaction: dict[str, Any] = {
+            "transactionId": f"tx-{i}",
+            "internalTransactionId": f"internal-{i}",
+            "bookingDate": day.isoformat(),
+            "valueDate": day.isoformat(),
+            "transactionAmount": {"amount": str(amount), "currency": "EUR"},
+            "creditorName": "Shop",
+            "creditorAccount": {"iban": "GB33BUKB20201555555555"},
+            "debitorName": "Employer",
+            "debitorAccount": {"bban": "20201555555555"},
+        }
+
+        if i % 20 == 0:
+            transaction["currencyExchange"] = {
+                "instructedAmount": {"amount": str(abs(amount)), "currency": "USD"},
+                "sourceCurrency": "USD",
+                "exchangeRate": 1.1,
+                "targetCurrency": "EUR",
+            }
+
+        transactions.append(GoCardlessTransaction.model_validate(transaction))
+
+    return transactions
+
+
+def normalize_with_model(
+    transaction: GoCardlessTransaction, account_id: str, user_id: str
+) -> dict[str, Any]:
+    """The previous implementation, through a `Transaction` model."""
+    native_amount = transaction.transactionAmount.amount
+    opposing_account = (
+        transaction.creditorAccount if native_amount < 0 else transaction.debitorAccount
+    )
+    opposing_name = (
+        transaction.creditorName if native_amount < 0 else transaction.debitorName
+    )
+
+    booking_time_str = transaction.bookingDateTime or transaction.bookingDate
+    value_time_str = transaction.valueDateTime or transaction.valueDate
+    assert booking_time_str
+
+    if transaction.currencyExchange:
+        amount = transaction.currencyExchange.instructedAmount.amount
+        currency = transaction.currencyExchange.instructedAmount.currency
+
+        if native_amount < 0:
+            amount = -amount
+    else:
+        amount = native_amount
+        currency = transaction.transactionAmount.currency
+
+    return Transaction(
+        account_id=account_id,
+        user_id=user_id,
+        amount=amount,
+        currency=currency,
+        native_amount=native_amount,
+        processing_status=ProcessingStatus.UNPROCESSED,
+        opposing_name=opposing_name,
+        opposing_iban=opposing_account.iban if opposing_account else None,
+        opposing_bban=opposing_account.bban if opposing_account else None,
+        gocardless_id=transaction.internalTransactionId,
+        internal_id=transaction.transactionId,
+        booking_time=datetime.fromisoformat(booking_time_str),
+        value_time=datetime.fromisoformat(value_time_str) if value_time_str else None,
+    ).model_dump()
+
+
+def rows_per_second(
+    normalize: Callable[[GoCardlessTransaction], dict[str, Any]],
+    transactions: list[GoCardlessTransaction],
+) -> float:
+    started = time.perf_counter()
+
+    for transaction in transactions:
+        normalize(transaction)
+
+    return len(transactions) / (time.perf_counter() - started)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    transactions = synthetic_transactions(count)
+
+    before = rows_per_second(
+        lambda transaction: normalize_with_model(transaction, "account", "user"),
+        transactions,
+    )
+    after = rows_per_second(TransactionNormalizer("account", "user"), transactions)
+
+    print(f"{'model':<12}{before:>12,.0f} rows/s")
+    print(f"{'normalizer':<12}{after:>12,.0f} rows/s")
+    print(f"{'speedup':<12}{after / before:>12.1f}x")
+
+
+if __name__ == "__main__":
+    main()
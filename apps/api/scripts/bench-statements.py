@@ -0,0 +1,92 @@
+"""
+Compare the per-request cost of the hot queries built as plain `select`
+statements against the cached statements in `api.db.statements`.
+
+Runs against an empty in-memory SQLite database, so the timings are dominated
+by building, caching and compiling the statements rather than by the query.
+
+    uv run scripts/bench-statements.py [iterations]
+"""
+
+import sys
+import timeit
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy.orm import selectinload
+from sqlmodel import Session, SQLModel, col, create_engine, select, tuple_
+
+from api.db.statements import accounts_by_user, transaction_page, user_by_id
+from api.models.account import Account
+from api.models.transaction import Transaction
+from api.models.user import User
+
+USER_ID = "user"
+CURSOR = (datetime(2025, 1, 1), "transaction")
+
+
+def plain_transaction_page():
+    return (
+        select(Transaction)
+        .where(Transaction.user_id == USER_ID)
+        .options(
+            selectinload(Transaction.account),
+            selectinload(Transaction.opposing_merchant),
+            selectinload(Transaction.opposing_counterparty),
+            selectinload(Transaction.opposing_account),
+        )
+        .order_by(col(Transaction.booking_time).desc(), col(Transaction.id).desc())
+        .where(tuple_(Transaction.booking_time, Transaction.id) < tuple_(*CURSOR))
+        .limit(100)
+    )
+
+
+QUERIES = {
+    "user by id": (
+        lambda: select(User).where(User.id == USER_ID),
+        lambda: user_by_id(USER_ID),
+    ),
+    "accounts": (
+        lambda: select(Account).where(Account.user_id == USER_ID),
+        lambda: accounts_by_user(USER_ID),
+    ),
+    "transaction page": (
+        plain_transaction_page,
+        lambda: transaction_page(USER_ID, 100, CURSOR),
+    ),
+}
+
+
+def bench(session, build, iterations, **execution_options):
+    def run():
+        session.scalars(build(), execution_options=execution_options).all()
+
+    # Warm up the caches
+    run()
+    return timeit.timeit(run, number=iterations) / iterations * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+
+    print(f"{'query':<18}{'uncached':>12}{'select':>12}{'lambda':>12}  (µs/call)")
+
+    with Session(engine) as session:
+        for name, (plain, cached) in QUERIES.items():
+            uncached_time = bench(session, plain, iterations, compiled_cache=None)
+            select_time = bench(session, plain, iterations)
+            lambda_time = bench(session, cached, iterations)
+
+            print(
+                f"{name:<18}{uncached_time:>12.1f}{select_time:>12.1f}"
+                f"{lambda_time:>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Shared fixtures.
+
+Tests run against `TEST_DATABASE_URL` when it's set, e.g. a throwaway Postgres
+database, and against an in-memory SQLite database otherwise. The tables are
+created from the models, every test starts with them empty.
+"""
+
+import os
+from collections.abc import Generator
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("JWT_SECRET", "test")
+os.environ.setdefault("HCAPTCHA_SITEKEY", "test")
+os.environ.setdefault("HCAPTCHA_SECRET", "test")
+os.environ.setdefault("GOCARDLESS_SECRET_ID", "test")
+os.environ.setdefault("GOCARDLESS_SECRET_KEY", "test")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from api.db.database import get_db, get_read_db
+from api.dependencies import get_user
+from api.main import app
+from api.models import User
+
+
+@pytest.fixture(scope="session")
+def engine() -> Generator[Engine, None, None]:
+    url = os.environ.get("TEST_DATABASE_URL")
+
+    if url:
+        engine = create_engine(url)
+    else:
+        # A single connection, in-memory databases are per connection
+        engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    SQLModel.metadata.drop_all(engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine: Engine) -> Generator[Session, None, None]:
+    with Session(engine) as session:
+        yield session
+
+    with engine.begin() as connection:
+        for table in reversed(SQLModel.metadata.sorted_tables):
+            connection.execute(table.delete())
+
+
+@pytest.fixture
+def user(db: Session) -> User:
+    user = User(
+        first_name="Test",
+        last_name="User",
+        email="test@example.com",
+        password_hash="",
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+
+    return user
+
+
+@pytest.fixture
+def client(engine: Engine, user: User) -> Generator[TestClient, None, None]:
+    """Client authenticated as `user`, its requests use the test database."""
+
+    def get_session() -> Generator[Session, None, None]:
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_user] = lambda: user
+    app.dependency_overrides[get_db] = get_session
+    app.dependency_overrides[get_read_db] = get_session
+
+    # Not used as a context manager, so the lifespan doesn't reach GoCardless
+    yield TestClient(app)
+
+    app.dependency_overrides.clear()
@@ -0,0 +1,15 @@
+from nanoid.resources import alphabet, size
+
+from api.core.gocardless_normalize import generate_id
+
+
+def test_nanoid_alphabet_maps_to_low_six_bits() -> None:
+    # generate_id relies on this to pick characters by the low 6 bits
+    assert len(alphabet) == 64
+
+
+def test_generate_id_matches_nanoid() -> None:
+    ids = {generate_id() for _ in range(1000)}
+
+    assert len(ids) == 1000
+    assert all(len(id_) == size and set(id_) <= set(alphabet) for id_ in ids)
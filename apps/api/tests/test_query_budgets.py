@@ -0,0 +1,181 @@
+"""
+Every endpoint with a query budget stays within a fixed number of queries.
+
+The budgets are repeated here rather than read from the endpoints, so raising
+one is a deliberate change to this file. The data is large enough that a
+query per row would blow every budget.
+"""
+
+from collections.abc import Generator
+from datetime import UTC, date, datetime, timedelta
+
+import pytest
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine
+from sqlmodel import Session
+
+from api.core.config import settings
+from api.db.database import get_read_db
+from api.db.query_budget import QueryCounter
+from api.main import app
+from api.models import (
+    Account,
+    AccountDailySummary,
+    Connection,
+    Counterparty,
+    Merchant,
+    Transaction,
+    User,
+)
+from api.models.enums.account import AccountType
+from api.models.enums.connection import ConnectionType
+
+BUDGETS = {
+    ("GET", "/account"): 1,
+    ("GET", "/account/statistics"): 1,
+    ("GET", "/connection"): 1,
+    ("GET", "/transaction"): 5,
+}
+
+ROWS = 20
+
+
+def budgeted_routes() -> dict[tuple[str, str], int]:
+    routes = {}
+
+    for route in app.routes:
+        if not isinstance(route, APIRoute):
+            continue
+
+        for dependency in route.dependant.dependencies:
+            max_queries = getattr(dependency.call, "max_queries", None)
+
+            if max_queries is not None:
+                for method in route.methods:
+                    routes[method, route.path] = max_queries
+
+    return routes
+
+
+@pytest.fixture
+def query_counters(engine: Engine) -> Generator[list[QueryCounter], None, None]:
+    """Counters of the read sessions handed to the endpoints."""
+    counters: list[QueryCounter] = []
+
+    def get_session() -> Generator[Session, None, None]:
+        # A session per request, so nothing is served from an identity map
+        with Session(engine) as session, QueryCounter(session) as counter:
+            counters.append(counter)
+            yield session
+
+    app.dependency_overrides[get_read_db] = get_session
+    yield counters
+    app.dependency_overrides.pop(get_read_db, None)
+
+
+@pytest.fixture
+def data(db: Session, user: User) -> None:
+    connection = Connection(
+        user_id=user.id,
+        connection_type=ConnectionType.GOCARDLESS,
+        internal_id="requisition",
+    )
+    db.add(connection)
+    db.flush()
+
+    accounts = [
+        Account(
+            connection_id=connection.id,
+            user_id=user.id,
+            name=f"Account {i}",
+            currency="EUR",
+            account_type=AccountType.BANK_GOCARDLESS,
+            balance_offset=0.0,
+            internal_id=f"account-{i}",
+        )
+        for i in range(ROWS)
+    ]
+    db.add_all(accounts)
+    db.flush()
+
+    today = date.today()
+    now = datetime.now(UTC)
+
+    for i in range(ROWS):
+        merchant = Merchant(name=f"Merchant {i}", category="shop", match_prefix="M")
+        counterparty = Counterparty(creator_id=user.id, name=f"Counterparty {i}")
+        db.add_all([merchant, counterparty])
+        db.flush()
+
+        db.add(
+            Transaction(
+                account_id=accounts[i].id,
+                user_id=user.id,
+                amount=-10.0,
+                currency="EUR",
+                native_amount=-10.0,
+                opposing_merchant_id=merchant.id,
+                opposing_counterparty_id=counterparty.id,
+                opposing_account_id=accounts[-i - 1].id,
+                internal_id=f"transaction-{i}",
+                booking_time=now - timedelta(hours=i),
+            )
+        )
+        db.add(
+            AccountDailySummary(
+                account_id=accounts[i].id,
+                day=today - timedelta(days=i),
+                user_id=user.id,
+                income=5.0,
+                expense=10.0,
+            )
+        )
+
+    db.commit()
+
+
+def test_every_budgeted_route_is_covered() -> None:
+    assert budgeted_routes() == BUDGETS
+
+
+@pytest.mark.usefixtures("data")
+@pytest.mark.parametrize(("method", "path"), sorted(BUDGETS))
+def test_query_budget(
+    client: TestClient,
+    query_counters: list[QueryCounter],
+    monkeypatch: pytest.MonkeyPatch,
+    method: str,
+    path: str,
+) -> None:
+    # Also makes the endpoint itself fail when it exceeds its budget
+    monkeypatch.setattr(settings, "QUERY_BUDGET_STRICT", True)
+
+    response = client.request(method, path)
+
+    assert response.status_code == 200, response.text
+    assert query_counters, "the endpoint didn't use the read session"
+    assert sum(counter.count for counter in query_counters) <= BUDGETS[method, path]
+
+
+@pytest.mark.usefixtures("data")
+def test_transaction_pages_stay_within_budget(
+    client: TestClient, query_counters: list[QueryCounter]
+) -> None:
+    response = client.get("/transaction", params={"limit": ROWS // 4})
+    pages = 1
+
+    while cursor := response.headers.get("X-Next-Cursor"):
+        query_counters.clear()
+        response = client.get(
+            "/transaction", params={"limit": ROWS // 4, "cursor": cursor}
+        )
+        pages += 1
+
+        assert response.status_code == 200, response.text
+        assert (
+            sum(counter.count for counter in query_counters)
+            <= BUDGETS["GET", "/transaction"]
+        )
+
+    assert pages > 1
@@ -0,0 +1,22 @@
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.mark.parametrize(
+    "params",
+    [{"limit": 0}, {"limit": -1}, {"limit": 501}, {"offset": -1}],
+)
+def test_out_of_range_paging_is_rejected(
+    client: TestClient, params: dict[str, int]
+) -> None:
+    response = client.get("/transaction", params=params)
+
+    assert response.status_code == 422, response.text
+
+
+def test_empty_page_has_no_cursor(client: TestClient) -> None:
+    response = client.get("/transaction", params={"limit": 1})
+
+    assert response.status_code == 200, response.text
+    assert response.json() == []
+    assert "X-Next-Cursor" not in response.headers